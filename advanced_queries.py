@@ -9,6 +9,8 @@ import json
 from typing import List, Dict, Any
 from datetime import datetime
 
+from food_search import search_filter, is_fulltext_error
+
 # Database configuration
 DB_CONFIG = {
     'host': '82.197.82.46',
@@ -372,21 +374,30 @@ class NutritionAnalyzer:
         """Search for foods by keyword"""
         self.print_section(f"13. SEARCH: '{keyword}'")
         
-        search_term = f"%{keyword}%"
-        self.cursor.execute(f"""
-            SELECT 
-                f.name,
-                fc.name as category,
-                nf.calories,
-                nf.protein_g,
-                nf.fat_g,
-                nf.carbohydrates_g
-            FROM foods f
-            JOIN food_categories fc ON f.category_id = fc.category_id
-            LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-            WHERE f.name LIKE %s OR f.description LIKE %s
-            LIMIT {limit}
-        """, (search_term, search_term))
+        for fulltext in (True, False):
+            search_sql, search_params, score_sql, score_params = search_filter(keyword, fulltext)
+            order_by = f"ORDER BY {score_sql} DESC" if score_sql else "ORDER BY f.name"
+            try:
+                self.cursor.execute(f"""
+                    SELECT 
+                        f.name,
+                        fc.name as category,
+                        nf.calories,
+                        nf.protein_g,
+                        nf.fat_g,
+                        nf.carbohydrates_g
+                    FROM foods f
+                    JOIN food_categories fc ON f.category_id = fc.category_id
+                    LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
+                    WHERE 1=1{search_sql}
+                    {order_by}
+                    LIMIT {limit}
+                """, search_params + score_params)
+                break
+            except mysql.connector.Error as e:
+                # Retry with LIKE when the full-text statement itself fails
+                if not score_sql or not is_fulltext_error(e):
+                    raise
         results = self.cursor.fetchall()
         self.print_results(results)
     
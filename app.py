@@ -4,48 +4,217 @@ Nutrition Database Web Dashboard
 Share your nutrition data with clients via browser
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
-import mysql.connector
+from flask import Flask, render_template, request, jsonify, g, Response, stream_with_context, make_response, has_request_context
 from datetime import datetime
-import json
-import csv
-from io import StringIO, BytesIO
 import os
+import functools
+import time
+
+from db_config import DB_CONFIG, POOL_CONFIG
+from db_router import DatabaseRouter, replica_configs, READ_YOUR_WRITES_SECONDS
+from data_version import DataVersionTracker
+from response_cache import ResponseCache
+from food_rankings import parse_metrics, build_top_foods_query, split_ranked_rows
+from fast_json import FastJSONProvider, columnar
+from compression import negotiate_encoding, should_compress, CompressedBodyCache
+from catalog_snapshot import SNAPSHOT_ENABLED, CatalogSnapshotStore
+from metrics import MetricsRegistry, QueryMetrics, InstrumentedCursor
+from slow_queries import SlowQueryLog
+from food_search import is_fulltext_error
+from prepared_statements import StatementCache
+from food_suggest import SUGGEST_LIMIT, SuggestIndexStore
+from food_spelling import SpellingIndexStore
+from food_similarity import SIMILARITY_ENABLED, SimilarityIndexStore
+from catalog_queries import (
+    INDEX_STATS_SQL, INDEX_CATEGORIES_SQL, CATEGORIES_SQL, FOOD_DETAIL_SQL, CATEGORY_STATS_SQL,
+    FOOD_LIST_COLUMNS, EXPORT_CHUNK_SIZE, CountCache, CsvChunkEncoder, decode_cursor, check_food_filters,
+    build_food_filters, food_count_sql, food_count_column, build_food_page_query, finish_food_page,
+    parse_batch_payload, parse_batch_request, build_food_batch_query, shape_batch_result, parse_id_list,
+    build_all_category_stats_query, build_export_query, export_filename
+)
 
 app = Flask(__name__)
-app.config['JSON_SORT_KEYS'] = False
+app.json = FastJSONProvider(app)
+app.json.sort_keys = False
+
+# Read replicas (host[:port],...) sharing the primary's credentials
+db_router = DatabaseRouter(
+    DB_CONFIG, replica_configs(DB_CONFIG, os.environ.get('DB_REPLICA_HOSTS', '')), **POOL_CONFIG
+)
+db_pool = db_router.primary
+
+# Set on responses to clients that just wrote, so their next reads see it
+READ_YOUR_WRITES_COOKIE = 'db_read_primary'
+
+def get_db(write=False):
+    """Get a pooled database connection for the current request
+
+    Reads go to a healthy replica when any are configured. Writes, and
+    reads from a client that wrote within READ_YOUR_WRITES_SECONDS, use
+    the primary.
+    """
+    if write:
+        g.db_wrote = True
+    if write or g.get('db_wrote'):
+        if g.get('db_primary') is None or g.db_primary.released:
+            g.db_primary = db_router.acquire_write()
+        return g.db_primary
+    
+    if g.get('db') is None or g.db.released:
+        sticky = has_request_context() and READ_YOUR_WRITES_COOKIE in request.cookies
+        g.db = db_router.acquire_read(prefer_primary=sticky)
+    return g.db
+
+@app.after_request
+def pin_reads_after_write(response):
+    if g.get('db_wrote'):
+        response.set_cookie(READ_YOUR_WRITES_COOKIE, '1', max_age=int(READ_YOUR_WRITES_SECONDS),
+                            httponly=True, samesite='Lax')
+    return response
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Return the request's connections to their pools, even after errors"""
+    for key in ('db', 'db_primary'):
+        conn = g.pop(key, None)
+        if conn is not None:
+            conn.close()
+
+# Request and query instrumentation, scraped from /metrics
+metrics = MetricsRegistry()
+query_metrics = QueryMetrics(metrics)
+http_requests = metrics.counter(
+    'http_requests_total', 'Responses by route, method and status code', ('route', 'method', 'status')
+)
+http_latency = metrics.histogram(
+    'http_request_duration_seconds', 'Time to handle a request, by route', ('route', 'method')
+)
+http_in_flight = metrics.gauge('http_requests_in_flight', 'Requests currently being handled')
+json_encode_latency = metrics.histogram('json_encode_duration_seconds', 'Time serializing JSON response bodies')
+json_bytes = metrics.counter('json_response_bytes_total', 'Serialized JSON bytes before compression')
+
+def record_json_encode(seconds, size):
+    json_encode_latency.observe((), seconds)
+    json_bytes.inc((), size)
+
+app.json.on_encode = record_json_encode
+
+# Statements over SLOW_QUERY_MS, with an EXPLAIN plan per new shape
+slow_queries = SlowQueryLog()
+
+def record_query(name, seconds, rows, failed, operation, params, conn):
+    query_metrics.record(name, seconds, rows, failed)
+    slow_queries.record(name, seconds, rows, failed, operation, params, conn)
+
+# Server-side prepared statements, kept per pooled connection by SQL shape
+statement_cache = StatementCache()
+
+def db_cursor(conn, name, prepared=False, **kwargs):
+    """Cursor whose statements are timed under `name` on /metrics and in the slow query log
+
+    prepared=True runs them as cached server-side prepared statements.
+    """
+    cursor = statement_cache.cursor(conn, **kwargs) if prepared else conn.cursor(**kwargs)
+    return InstrumentedCursor(cursor, name, record_query, conn)
 
-# Database configuration
-DB_CONFIG = {
-    'host': '82.197.82.46',
-    'user': 'u280406916_nutrition',
-    'password': 'Mutsokoti08@',
-    'database': 'u280406916_nutrition',
-    'port': 3306
-}
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    http_in_flight.inc()
 
-def get_db():
-    """Get database connection"""
-    return mysql.connector.connect(**DB_CONFIG)
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exception):
+    """Observe latency and status; streamed responses count until the stream ends"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = g.pop('response_status', 500)
+    http_latency.observe((route, request.method), time.perf_counter() - started)
+    http_requests.inc((route, request.method, str(status)))
+    http_in_flight.dec()
+
+# Catalog change detection and the response cache it invalidates
+data_version = DataVersionTracker(check_interval=float(os.environ.get('DATA_VERSION_CHECK_INTERVAL', 5)))
+response_cache = ResponseCache(max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', 512)))
+
+def cached_response(view):
+    """Serve a GET route from the response cache with ETag / If-None-Match support
+
+    Entries are keyed by path and query string and live until the catalog
+    data version changes.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET':
+            return view(*args, **kwargs)
+        try:
+            version = data_version.current(get_db)
+        except Exception:
+            return view(*args, **kwargs)
+        
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        entry = response_cache.lookup(key, version)
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            etag = response_cache.store(key, version, response.get_data(), response.mimetype)
+        else:
+            body, etag, mimetype = entry
+            response = Response(body, mimetype=mimetype)
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    return wrapper
+
+compressed_bodies = CompressedBodyCache()
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli-encode large responses for clients that accept it"""
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    length = response.content_length or 0
+    if not should_compress(response.status_code, response.mimetype, response.headers, length):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    
+    etag, _ = response.get_etag()
+    response.set_data(compressed_bodies.compress(response.get_data(), encoding, etag))
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # The encoded body differs byte-for-byte, so its tag can only be weak
+        response.set_etag(etag, weak=True)
+    return response
+
+def shape_rows(rows):
+    """Row list as sent to the client: dicts, or columnar with format=columns"""
+    return columnar(rows) if request.args.get('format') == 'columns' else rows
 
 @app.route('/')
 def index():
     """Main dashboard page"""
     try:
         conn = get_db()
-        cursor = conn.cursor(dictionary=True)
+        cursor = db_cursor(conn, 'dashboard_summary', dictionary=True)
         
         # Get stats
-        cursor.execute("""
-            SELECT 
-                (SELECT COUNT(*) FROM food_categories) as categories,
-                (SELECT COUNT(*) FROM foods) as foods,
-                (SELECT COUNT(*) FROM nutrition_facts) as nutrition_records
-        """)
+        cursor.execute(INDEX_STATS_SQL)
         stats = cursor.fetchone()
         
         # Get categories
-        cursor.execute("SELECT category_id, name FROM food_categories ORDER BY name")
+        cursor.execute(INDEX_CATEGORIES_SQL)
         categories = cursor.fetchall()
         
         cursor.close()
@@ -55,111 +224,188 @@ def index():
     except Exception as e:
         return f"Error: {e}", 500
 
+# Per-filter result counts, so paging through one search counts it only once
+count_cache = CountCache(ttl=300, max_entries=1024)
+
+@data_version.on_change
+def clear_count_cache(version):
+    """Totals are stale once the catalog changes"""
+    count_cache.clear()
+
+# Columnar in-memory copy of the catalog for food lists without a search term
+catalog_snapshots = CatalogSnapshotStore(data_version) if SNAPSHOT_ENABLED else None
+
+def snapshot_food_page(category_id, min_cal, max_cal, after, offset, limit):
+    """(foods, total) for a filter-only page from the snapshot, or None to ask MySQL"""
+    snapshot = catalog_snapshots.get(get_db)
+    if snapshot is None:
+        return None
+    ranges = {'calories': (float(min_cal) if min_cal else None, float(max_cal) if max_cal else None)}
+    try:
+        positions, total = snapshot.page(category_id, ranges, after[1] if after else None, offset, limit)
+    except KeyError:
+        # The cursor's food is gone from this version of the catalog
+        return None
+    return snapshot.rows(positions, FOOD_LIST_COLUMNS), total
+
 @app.route('/api/foods', methods=['GET'])
 def api_foods():
-    """Search and filter foods"""
+    """Search and filter foods
+
+    Pages with an opaque `cursor` token (keyset on name, food_id); pass the
+    returned `next_cursor` to fetch the following page. `page` is still
+    accepted for older clients and falls back to OFFSET paging. With a
+    search term, `sort=relevance` orders by full-text score instead.
+    `format=columns` sends the rows as column names plus value arrays.
+    """
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        
         # Get parameters
         search = request.args.get('search', '').strip()
         category_id = request.args.get('category', '')
         min_cal = request.args.get('min_cal', '')
         max_cal = request.args.get('max_cal', '')
+        sort = request.args.get('sort', 'name')
+        cursor_token = request.args.get('cursor', '').strip()
+        use_offset = 'page' in request.args and not cursor_token
         page = int(request.args.get('page', 1))
         limit = 20
         offset = (page - 1) * limit
         
-        # Build query
-        query = """
-            SELECT 
-                f.food_id,
-                f.name,
-                fc.name as category,
-                nf.calories,
-                nf.protein_g,
-                nf.fat_g,
-                nf.carbohydrates_g,
-                nf.fiber_g,
-                nf.sodium_mg,
-                nf.sugar_g
-            FROM foods f
-            JOIN food_categories fc ON f.category_id = fc.category_id
-            LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-            WHERE 1=1
-        """
-        
-        params = []
-        
-        if search:
-            query += " AND (f.name LIKE %s OR f.description LIKE %s)"
-            params.extend([f"%{search}%", f"%{search}%"])
-        
-        if category_id:
-            query += " AND fc.category_id = %s"
-            params.append(category_id)
-        
-        if min_cal:
-            query += " AND nf.calories >= %s"
-            params.append(min_cal)
-        
-        if max_cal:
-            query += " AND nf.calories <= %s"
-            params.append(max_cal)
-        
-        # Get total count (without ORDER BY)
-        count_query = query.replace(
-            "SELECT f.food_id, f.name, fc.name as category, nf.calories, nf.protein_g, nf.fat_g, nf.carbohydrates_g, nf.fiber_g, nf.sodium_mg, nf.sugar_g",
-            "SELECT COUNT(*) as total"
-        )
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()['total']
-        
-        # Get results with ORDER BY and LIMIT
-        query += " ORDER BY f.name"
-        query += f" LIMIT {limit} OFFSET {offset}"
-        cursor.execute(query, params)
-        foods = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
+        after = None
+        try:
+            check_food_filters(category_id, min_cal, max_cal)
+            if cursor_token:
+                after = decode_cursor(cursor_token)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        filters = build_food_filters(search, category_id, min_cal, max_cal)
+        by_relevance = sort == 'relevance' and filters.score_sql is not None
+        if after and isinstance(after[0], str) == by_relevance:
+            return jsonify({'success': False, 'error': 'Cursor does not match sort order'}), 400
+        
+        snapshot_page = None
+        if catalog_snapshots is not None and not search:
+            snapshot_page = snapshot_food_page(
+                category_id, min_cal, max_cal, after, offset if use_offset else 0, limit
+            )
+        
+        if snapshot_page is not None:
+            foods, total = snapshot_page
+            approximate = False
+        else:
+            conn = get_db()
+            data_version.current(get_db)
+            cursor = db_cursor(conn, 'food_list', prepared=True, dictionary=True)
+        
+            count_key = (search, category_id, min_cal, max_cal)
+            total, approximate = count_cache.get(count_key)
+        
+            while True:
+                # Fold the total into the page query so it costs no extra round trip
+                count_column, count_params = "", []
+                if total is None:
+                    count_column, count_params, approximate = food_count_column(filters, after)
+            
+                # One extra row tells us if more follow
+                query, params = build_food_page_query(
+                    filters, after, by_relevance, limit,
+                    offset=offset if use_offset else None,
+                    count_column=count_column, count_params=count_params
+                )
+                try:
+                    cursor.execute(query, params)
+                    break
+                except Exception as e:
+                    if filters.score_sql is None or not is_fulltext_error(e) or (after and by_relevance):
+                        raise
+                    # The full-text statement failed; repeat the search with LIKE
+                    filters = build_food_filters(search, category_id, min_cal, max_cal, fulltext=False)
+                    by_relevance = False
+            foods = cursor.fetchall()
+        
+            if total is None:
+                if foods:
+                    total = int(foods[0]['total_matches'] or 0)
+                elif after is None and offset == 0:
+                    total = 0
+                else:
+                    # Paged past the end: the window had no rows to report on
+                    cursor.execute(food_count_sql(filters), filters.params)
+                    total = cursor.fetchone()['total']
+                count_cache.set(count_key, total, approximate)
+                for food in foods:
+                    food.pop('total_matches', None)
+        
+            cursor.close()
+            conn.close()
+        
+        foods, next_cursor = finish_food_page(foods, limit, by_relevance)
+        
+        response = {
             'success': True,
-            'foods': foods,
+            'foods': shape_rows(foods),
             'total': total,
-            'page': page,
+            'total_is_approximate': approximate,
             'limit': limit,
-            'pages': (total + limit - 1) // limit
-        })
+            'next_cursor': next_cursor
+        }
+        if use_offset:
+            response['page'] = page
+            response['pages'] = (total + limit - 1) // limit
+        if not foods and search and after is None and offset == 0:
+            response['did_you_mean'] = spelling_correction(search)
+        return jsonify(response)
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Prefix index over food names for type-ahead, updated as the catalog changes
+suggest_index = SuggestIndexStore(data_version)
+
+# Trigram index over catalog words for "did you mean"
+spelling_index = SpellingIndexStore(data_version)
+
+def spelling_correction(term):
+    """Closest spelling of `term` the catalog knows, or None"""
+    index = spelling_index.get(get_db)
+    return index.correct(term) if index is not None else None
+
+@app.route('/api/suggest')
+def api_suggest():
+    """Type-ahead suggestions for a partial food name
+
+    `q` matches the start of a name or of any later word in it, most used
+    foods first; `limit` defaults to 10 (max 25). When nothing matches, a
+    spelling correction is tried and returned as `did_you_mean`.
+    """
+    try:
+        q = request.args.get('q', '')
+        limit = min(max(int(request.args.get('limit', SUGGEST_LIMIT)), 1), 25)
+        
+        index = suggest_index.get(get_db)
+        suggestions = index.suggest(q, limit) if index is not None else []
+        
+        did_you_mean = None
+        if not suggestions and index is not None:
+            did_you_mean = spelling_correction(q)
+            if did_you_mean:
+                suggestions = index.suggest(did_you_mean, limit)
+        
+        return jsonify({'success': True, 'query': q, 'suggestions': suggestions, 'did_you_mean': did_you_mean})
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/food/<int:food_id>')
+@cached_response
 def api_food_details(food_id):
     """Get detailed nutrition info for a food"""
     try:
         conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT 
-                f.food_id,
-                f.name,
-                f.description,
-                f.brand,
-                fc.name as category,
-                f.serving_size,
-                f.serving_weight_g,
-                nf.*
-            FROM foods f
-            JOIN food_categories fc ON f.category_id = fc.category_id
-            LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-            WHERE f.food_id = %s
-        """, (food_id,))
+        cursor = db_cursor(conn, 'food_detail', dictionary=True)
         
+        cursor.execute(FOOD_DETAIL_SQL, (food_id,))
         food = cursor.fetchone()
         cursor.close()
         conn.close()
@@ -172,24 +418,91 @@ def api_food_details(food_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Normalized nutrient vectors for nearest-neighbour lookups (needs NumPy)
+similarity_index = SimilarityIndexStore(data_version) if SIMILARITY_ENABLED else None
+
+@app.route('/api/food/<int:food_id>/similar')
+@cached_response
+def api_similar_foods(food_id):
+    """Foods with the closest nutrient profile
+
+    `limit` neighbours (default 10, max 50), nearest first. `category=<id>`
+    or `category=same` keeps them to one category; `exact=1` skips the
+    approximate index large catalogs otherwise use.
+    """
+    if similarity_index is None:
+        return jsonify({'success': False, 'error': 'Similarity search needs NumPy (pip install numpy)'}), 503
+    try:
+        category = request.args.get('category', '').strip()
+        exact = request.args.get('exact', '') in ('1', 'true', 'yes')
+        try:
+            limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+            category_id = None if category in ('', 'same') else int(category)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid limit or category'}), 400
+        
+        index = similarity_index.get(get_db)
+        if index is None:
+            return jsonify({'success': False, 'error': 'Similarity index is still building'}), 503
+        try:
+            positions, distances = index.similar(
+                food_id, limit,
+                category_id=category_id, same_category=category == 'same', exact=exact
+            )
+        except KeyError:
+            return jsonify({'success': False, 'error': 'Food not found or has no nutrition facts'}), 404
+        
+        return jsonify({'success': True, 'food_id': food_id, 'similar': index.rows(positions, distances)})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/foods/batch', methods=['GET', 'POST'])
+@cached_response
+def api_foods_batch():
+    """Get details for many foods in one query
+
+    GET takes `ids=1,2,3` and optional `fields=calories,protein_g`; POST
+    accepts the same as form fields or as JSON lists for long id lists.
+    Foods come back keyed by id, with unknown ids listed under `missing`.
+    """
+    try:
+        payload = request.get_json(silent=True) if request.method == 'POST' else None
+        
+        try:
+            if payload is not None:
+                raw_ids, raw_fields = parse_batch_payload(payload)
+            else:
+                values = request.form if request.method == 'POST' else request.args
+                raw_ids = values.get('ids', '').split(',')
+                raw_fields = values.get('fields', '').split(',')
+            food_ids, fields = parse_batch_request(raw_ids, raw_fields)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        conn = get_db()
+        cursor = db_cursor(conn, 'food_batch', dictionary=True)
+        
+        query, params = build_food_batch_query(food_ids, fields)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        
+        return jsonify({'success': True, **shape_batch_result(rows, food_ids)})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/categories')
+@cached_response
 def api_categories():
     """Get all categories"""
     try:
         conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT 
-                fc.category_id,
-                fc.name,
-                COUNT(f.food_id) as food_count
-            FROM food_categories fc
-            LEFT JOIN foods f ON fc.category_id = f.category_id
-            GROUP BY fc.category_id, fc.name
-            ORDER BY fc.name
-        """)
+        cursor = db_cursor(conn, 'categories', dictionary=True)
         
+        cursor.execute(CATEGORIES_SQL)
         categories = cursor.fetchall()
         cursor.close()
         conn.close()
@@ -199,31 +512,42 @@ def api_categories():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/category-stats')
+@cached_response
+def api_all_category_stats():
+    """Nutrition statistics for every category from one grouped pass
+
+    Optional `ids=1,2,3` restricts the result to those categories.
+    """
+    try:
+        try:
+            category_ids = parse_id_list(request.args.get('ids', ''))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'ids must be a comma-separated list of integers'}), 400
+        
+        conn = get_db()
+        cursor = db_cursor(conn, 'category_stats', dictionary=True)
+        
+        query, params = build_all_category_stats_query(category_ids)
+        cursor.execute(query, params)
+        stats = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        
+        return jsonify({'success': True, 'stats': shape_rows(stats)})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/category-stats/<int:category_id>')
+@cached_response
 def api_category_stats(category_id):
     """Get category nutrition statistics"""
     try:
         conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT 
-                fc.name as category,
-                COUNT(nf.nutrition_id) as total_foods,
-                ROUND(AVG(nf.calories), 2) as avg_calories,
-                ROUND(AVG(nf.protein_g), 2) as avg_protein,
-                ROUND(AVG(nf.fat_g), 2) as avg_fat,
-                ROUND(AVG(nf.carbohydrates_g), 2) as avg_carbs,
-                ROUND(AVG(nf.fiber_g), 2) as avg_fiber,
-                ROUND(MAX(nf.calories), 2) as max_calories,
-                ROUND(MIN(nf.calories), 2) as min_calories
-            FROM food_categories fc
-            LEFT JOIN foods f ON fc.category_id = f.category_id
-            LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-            WHERE fc.category_id = %s AND nf.calories IS NOT NULL
-            GROUP BY fc.category_id, fc.name
-        """, (category_id,))
+        cursor = db_cursor(conn, 'category_stats_single', dictionary=True)
         
+        cursor.execute(CATEGORY_STATS_SQL, (category_id,))
         stats = cursor.fetchone()
         cursor.close()
         conn.close()
@@ -236,124 +560,204 @@ def api_category_stats(category_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def stream_csv(conn, cursor, compress=False):
+    """Yield CSV bytes (optionally gzipped) as rows arrive from an unbuffered cursor"""
+    encoder = CsvChunkEncoder(compress)
+    finished = False
+    try:
+        rows = [cursor.column_names]
+        while rows:
+            data = encoder.encode(rows)
+            if data:
+                yield data
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+        tail = encoder.finish()
+        if tail:
+            yield tail
+        finished = True
+    finally:
+        if finished:
+            try:
+                cursor.close()
+            finally:
+                conn.close()
+        else:
+            # Client went away mid-export; drop the connection rather than
+            # let closing the cursor or the pool's rollback read the rest
+            # of the result set
+            conn.discard()
+
 @app.route('/api/export-csv', methods=['GET'])
 def export_csv():
-    """Export search results as CSV"""
+    """Stream search results as CSV
+
+    Rows are fetched from an unbuffered cursor in chunks and written to the
+    client as they arrive, so memory stays flat regardless of export size.
+    Pass gzip=1 for a compressed .csv.gz download and limit=N to cap rows.
+    """
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        
         search = request.args.get('search', '').strip()
         category_id = request.args.get('category', '')
+        row_limit = request.args.get('limit', '')
+        compress = request.args.get('gzip', '') in ('1', 'true', 'yes')
         
-        query = """
-            SELECT 
-                f.name,
-                fc.name as category,
-                nf.calories,
-                nf.protein_g,
-                nf.fat_g,
-                nf.carbohydrates_g,
-                nf.fiber_g,
-                nf.sugar_g,
-                nf.sodium_mg,
-                nf.cholesterol_mg,
-                nf.calcium_mg,
-                nf.iron_mg,
-                nf.vitamin_c_mg
-            FROM foods f
-            JOIN food_categories fc ON f.category_id = fc.category_id
-            LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-            WHERE 1=1
-        """
-        
-        params = []
-        
-        if search:
-            query += " AND (f.name LIKE %s OR f.description LIKE %s)"
-            params.extend([f"%{search}%", f"%{search}%"])
-        
-        if category_id:
-            query += " AND fc.category_id = %s"
-            params.append(category_id)
-        
-        query += " ORDER BY f.name LIMIT 5000"
-        
-        cursor.execute(query, params)
-        foods = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        query, params = build_export_query(search, category_id, row_limit)
         
-        # Create CSV
-        output = StringIO()
-        writer = csv.DictWriter(output, fieldnames=foods[0].keys() if foods else [])
-        writer.writeheader()
-        writer.writerows(foods)
-        
-        output.seek(0)
-        return send_file(
-            BytesIO(output.getvalue().encode('utf-8')),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'nutrition_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        conn = get_db()
+        cursor = db_cursor(conn, 'export_csv', prepared=True, buffered=False)
+        try:
+            cursor.execute(query, params)
+        except Exception as e:
+            if not search or not is_fulltext_error(e):
+                raise
+            cursor.execute(*build_export_query(search, category_id, row_limit, fulltext=False))
+        
+        filename = export_filename(compress, datetime.now())
+        
+        return Response(
+            stream_with_context(stream_csv(conn, cursor, compress)),
+            mimetype='application/gzip' if compress else 'text/csv',
+            headers={
+                'Content-Disposition': f'attachment; filename={filename}',
+                'X-Accel-Buffering': 'no'
+            }
         )
     
     except Exception as e:
         return f"Error: {e}", 500
 
 @app.route('/api/top-foods', methods=['GET'])
+@cached_response
 def api_top_foods():
-    """Get top foods by various metrics"""
+    """Get top foods by various metrics
+
+    `metrics=calories,protein,fiber` returns the top `limit` foods for each
+    listed metric from a single scan, keyed by metric. The older
+    `metric=calories` form returns one list. An optional `category` id
+    narrows the ranking; `format=columns` as for /api/foods.
+    """
     try:
-        conn = get_db()
-        cursor = conn.cursor(dictionary=True)
-        
-        metric = request.args.get('metric', 'calories')
-        limit = int(request.args.get('limit', 10))
-        
-        if metric == 'calories':
-            query = """
-                SELECT f.name, fc.name as category, nf.calories
-                FROM foods f
-                JOIN food_categories fc ON f.category_id = fc.category_id
-                LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-                WHERE nf.calories IS NOT NULL
-                ORDER BY nf.calories DESC
-                LIMIT %s
-            """
-        elif metric == 'protein':
-            query = """
-                SELECT f.name, fc.name as category, nf.protein_g
-                FROM foods f
-                JOIN food_categories fc ON f.category_id = fc.category_id
-                LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-                WHERE nf.protein_g IS NOT NULL
-                ORDER BY nf.protein_g DESC
-                LIMIT %s
-            """
-        elif metric == 'fiber':
-            query = """
-                SELECT f.name, fc.name as category, nf.fiber_g
-                FROM foods f
-                JOIN food_categories fc ON f.category_id = fc.category_id
-                LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-                WHERE nf.fiber_g IS NOT NULL
-                ORDER BY nf.fiber_g DESC
-                LIMIT %s
-            """
-        else:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+        category_id = request.args.get('category', '')
+        multi = 'metrics' in request.args
+        
+        try:
+            metrics = parse_metrics(request.args.get('metrics') if multi else request.args.get('metric', 'calories'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if not metrics:
             return jsonify({'success': False, 'error': 'Invalid metric'}), 400
         
-        cursor.execute(query, (limit,))
-        foods = cursor.fetchall()
+        conn = get_db()
+        cursor = db_cursor(conn, 'top_foods', dictionary=True)
+        
+        query, params = build_top_foods_query(metrics, limit, category_id=category_id)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
         cursor.close()
         conn.close()
         
-        return jsonify({'success': True, 'foods': foods})
+        top_foods = split_ranked_rows(rows, metrics, limit)
+        
+        if multi:
+            return jsonify({'success': True, 'top_foods': {m: shape_rows(foods) for m, foods in top_foods.items()}})
+        return jsonify({'success': True, 'foods': shape_rows(top_foods[metrics[0]])})
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/pool-stats')
+def api_pool_stats():
+    """Connection pool occupancy and checkout latency"""
+    return jsonify({
+        'success': True,
+        'pool': db_pool.stats(),
+        'replicas': db_router.replica_stats(),
+        'response_cache': response_cache.stats(),
+        'prepared_statements': statement_cache.stats(),
+        'suggest_index': suggest_index.stats(),
+        'spelling_index': spelling_index.stats(),
+        'similarity_index': similarity_index.stats() if similarity_index else None,
+        'catalog_snapshot': catalog_snapshots.stats() if catalog_snapshots else None
+    })
+
+@metrics.collector
+def pool_metrics():
+    """Pool, statement and response cache figures, read at scrape time"""
+    pools = [(name, pool.stats()) for name, pool in db_router.pools()]
+    replicas = db_router.replicas.status()
+    cache = response_cache.stats()
+    statements = statement_cache.stats()
+    
+    def per_pool(key, scale=1):
+        return {(('pool', name),): stats[key] * scale for name, stats in pools}
+    
+    return [
+        ('db_pool_connections', 'gauge', 'Pool connections by state',
+         {(('pool', name), ('state', state)): stats[state]
+          for name, stats in pools for state in ('open', 'idle', 'in_use', 'waiting')}),
+        ('db_pool_size', 'gauge', 'Maximum open connections', per_pool('pool_size')),
+        ('db_pool_checkouts_total', 'counter', 'Connections handed out', per_pool('checkouts')),
+        ('db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting', per_pool('timeouts')),
+        ('db_pool_connections_created_total', 'counter', 'Connections opened', per_pool('connections_created')),
+        ('db_pool_connections_recycled_total', 'counter', 'Connections closed for age or idleness',
+         per_pool('connections_recycled')),
+        ('db_pool_validation_failures_total', 'counter', 'Idle connections that failed their ping',
+         per_pool('validation_failures')),
+        ('db_pool_checkout_latency_max_seconds', 'gauge', 'Slowest checkout so far',
+         per_pool('checkout_latency_max_ms', 0.001)),
+        ('db_replica_healthy', 'gauge', 'Replica receiving reads (1) or skipped (0)',
+         {(('replica', r['name']),): int(r['healthy']) for r in replicas}),
+        ('db_replica_lag_seconds', 'gauge', 'Replication lag at the last health check',
+         {(('replica', r['name']),): r['lag'] for r in replicas if r['lag'] is not None}),
+        ('response_cache_entries', 'gauge', 'Cached responses', {(): cache['entries']}),
+        ('response_cache_hits_total', 'counter', 'Responses served from cache', {(): cache['hits']}),
+        ('response_cache_misses_total', 'counter', 'Responses built on a cache miss', {(): cache['misses']}),
+        ('db_prepared_statement_hits_total', 'counter', 'Executions that reused a prepared statement',
+         {(): statements['hits']}),
+        ('db_prepared_statement_misses_total', 'counter', 'Statements prepared on first use',
+         {(): statements['misses']}),
+        ('db_prepared_statement_evictions_total', 'counter', 'Prepared statements closed to stay within capacity',
+         {(): statements['evictions']})
+    ]
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request, query, pool and cache metrics in Prometheus text format"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Set ENABLE_DEBUG_ENDPOINTS=1 to expose captured SQL and parameters
+DEBUG_ENDPOINTS = os.environ.get('ENABLE_DEBUG_ENDPOINTS', '') in ('1', 'true', 'yes')
+
+@app.route('/api/debug/slow-queries', methods=['GET', 'POST'])
+def api_slow_queries():
+    """Slow statements, per-shape totals and EXPLAIN plans
+
+    POST also writes the snapshot to a new timestamped file under
+    SLOW_QUERY_DUMP_DIR and returns its path as `dumped_to`.
+    """
+    if not DEBUG_ENDPOINTS:
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    try:
+        if request.method == 'POST':
+            dumped_to = slow_queries.dump()
+            return jsonify({'success': True, 'dumped_to': dumped_to, **slow_queries.snapshot()})
+        return jsonify({'success': True, **slow_queries.snapshot()})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def warm_up(connections=None):
+    """Fill the connection pool and prime the catalog caches and search indexes before serving"""
+    db_router.warm(connections)
+    with app.test_client() as client:
+        client.get('/api/categories')
+        client.get('/api/category-stats')
+        client.get('/api/top-foods?metrics=calories,protein,fiber&limit=10')
+        client.get('/api/suggest?q=a')
+    with app.app_context():
+        spelling_index.get(get_db)
+
 if __name__ == '__main__':
     # Development
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+"""
+Nutrition Database Web Dashboard (async)
+ASGI version of app.py on Quart + aiomysql: same routes, same templates/index.html
+
+Database round trips no longer hold a worker, so one process serves many
+slow requests at once, and independent queries inside a request run
+concurrently on separate pooled connections.
+
+Run with:
+    hypercorn async_app:app --bind 0.0.0.0:5000
+"""
+
+from quart import Quart, render_template, request, jsonify, Response, make_response
+from quart.wrappers.response import DataBody
+import aiomysql
+import pymysql
+from datetime import datetime
+import asyncio
+import functools
+import os
+
+from db_config import DB_CONFIG, POOL_CONFIG
+from db_pool import PoolExhaustedError
+from data_version import (
+    DataVersionTracker, DATA_VERSION_SQL, DATA_VERSION_FALLBACK_SQL, ER_NO_SUCH_TABLE, version_from_row
+)
+from response_cache import ResponseCache
+from food_search import is_fulltext_error
+from food_suggest import SUGGEST_LIMIT, SuggestIndexStore
+from food_spelling import SpellingIndexStore
+from food_similarity import SIMILARITY_ENABLED, SimilarityIndexStore
+from food_rankings import parse_metrics, build_top_foods_query, split_ranked_rows
+from fast_json import FastJSONProvider, columnar
+from compression import negotiate_encoding, should_compress, CompressedBodyCache
+from catalog_queries import (
+    INDEX_STATS_SQL, INDEX_CATEGORIES_SQL, CATEGORIES_SQL, FOOD_DETAIL_SQL, CATEGORY_STATS_SQL,
+    FOOD_COUNT_ESTIMATE_SQL, EXPORT_CHUNK_SIZE, CountCache, CsvChunkEncoder, decode_cursor,
+    check_food_filters, build_food_filters, food_count_sql, build_food_page_query, finish_food_page,
+    parse_batch_payload, parse_batch_request, build_food_batch_query, shape_batch_result, parse_id_list,
+    build_all_category_stats_query, build_export_query, export_filename
+)
+
+app = Quart(__name__)
+app.json = FastJSONProvider(app)
+app.json.sort_keys = False
+
+db_pool = None
+
+@app.before_serving
+async def open_pool():
+    """Create the async connection pool once the event loop is running"""
+    global db_pool
+    db_pool = await aiomysql.create_pool(
+        host=DB_CONFIG['host'],
+        port=DB_CONFIG['port'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        db=DB_CONFIG['database'],
+        minsize=int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+        maxsize=POOL_CONFIG['pool_size'],
+        pool_recycle=int(POOL_CONFIG['max_lifetime']),
+        autocommit=True
+    )
+
+@app.after_serving
+async def close_pool():
+    db_pool.close()
+    await db_pool.wait_closed()
+
+async def acquire_connection():
+    """Check out a connection, failing like the sync pool when none frees up"""
+    timeout = POOL_CONFIG['checkout_timeout']
+    try:
+        return await asyncio.wait_for(db_pool.acquire(), timeout)
+    except asyncio.TimeoutError:
+        raise PoolExhaustedError(
+            f"Connection pool exhausted: no connection available within {timeout:.1f}s "
+            f"(all {db_pool.maxsize} connections in use)"
+        )
+
+async def fetch_all(query, params=None, cursor_class=aiomysql.DictCursor):
+    """Run a read query on its own pooled connection and return every row"""
+    conn = await acquire_connection()
+    try:
+        async with conn.cursor(cursor_class) as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+    finally:
+        db_pool.release(conn)
+
+async def fetch_one(query, params=None):
+    """Run a read query on its own pooled connection and return the first row"""
+    rows = await fetch_all(query, params)
+    return rows[0] if rows else None
+
+class BlockingCursor:
+    """Plain DB-API cursor over the async pool, for code running in a worker thread
+
+    Each execute() runs the query back on the event loop and buffers its
+    tuple rows, so the in-memory index stores can refresh unchanged.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._rows = []
+        self._pos = 0
+
+    def execute(self, query, params=None):
+        future = asyncio.run_coroutine_threadsafe(fetch_all(query, params, aiomysql.Cursor), self._loop)
+        self._rows, self._pos = future.result(), 0
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        rows = self._rows[self._pos:self._pos + size]
+        self._pos += len(rows)
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(len(self._rows))
+
+    def close(self):
+        self._rows = []
+
+class BlockingConnection:
+    def __init__(self, loop):
+        self._loop = loop
+
+    def cursor(self):
+        return BlockingCursor(self._loop)
+
+async def load_index(store):
+    """store.get() for an in-memory index; a due refresh runs in a worker thread"""
+    await current_data_version()
+    conn = BlockingConnection(asyncio.get_running_loop())
+    return await asyncio.to_thread(store.get, lambda: conn)
+
+# Catalog change detection and the response cache it invalidates
+data_version = DataVersionTracker(check_interval=float(os.environ.get('DATA_VERSION_CHECK_INTERVAL', 5)))
+response_cache = ResponseCache(max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', 512)))
+
+async def current_data_version():
+    """Catalog version, polling the database only when the tracker says it is due"""
+    version = data_version.peek()
+    if version is not None:
+        return version
+
+    conn = await acquire_connection()
+    try:
+        async with conn.cursor() as cursor:
+            try:
+                await cursor.execute(DATA_VERSION_SQL)
+            except pymysql.err.ProgrammingError as e:
+                # Databases that predate catalog_version still get updated_at tracking
+                if e.args[0] != ER_NO_SUCH_TABLE:
+                    raise
+                await cursor.execute(DATA_VERSION_FALLBACK_SQL)
+            row = await cursor.fetchone()
+    finally:
+        db_pool.release(conn)
+    return data_version.record(version_from_row(row))
+
+def cached_response(view):
+    """Serve a GET route from the response cache with ETag / If-None-Match support"""
+    @functools.wraps(view)
+    async def wrapper(*args, **kwargs):
+        if request.method != 'GET':
+            return await view(*args, **kwargs)
+        try:
+            version = await current_data_version()
+        except Exception:
+            return await view(*args, **kwargs)
+
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        entry = response_cache.lookup(key, version)
+        if entry is None:
+            response = await make_response(await view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = await response.get_data()
+            etag = response_cache.store(key, version, body, response.mimetype)
+        else:
+            body, etag, mimetype = entry
+            response = Response(body, mimetype=mimetype)
+
+        if request.if_none_match.contains_weak(etag):
+            response = Response(b'', status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+compressed_bodies = CompressedBodyCache()
+
+@app.after_request
+async def compress_response(response):
+    """gzip/brotli-encode large responses for clients that accept it"""
+    if not isinstance(response.response, DataBody):
+        return response
+    length = response.content_length or 0
+    if not should_compress(response.status_code, response.mimetype, response.headers, length):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+
+    etag, _ = response.get_etag()
+    response.set_data(compressed_bodies.compress(await response.get_data(), encoding, etag))
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # The encoded body differs byte-for-byte, so its tag can only be weak
+        response.set_etag(etag, weak=True)
+    return response
+
+def shape_rows(rows):
+    """Row list as sent to the client: dicts, or columnar with format=columns"""
+    return columnar(rows) if request.args.get('format') == 'columns' else rows
+
+@app.route('/')
+async def index():
+    """Main dashboard page"""
+    try:
+        stats, categories = await asyncio.gather(
+            fetch_one(INDEX_STATS_SQL),
+            fetch_all(INDEX_CATEGORIES_SQL)
+        )
+        return await render_template('index.html', stats=stats, categories=categories)
+    except Exception as e:
+        return f"Error: {e}", 500
+
+# Per-filter result counts, so paging through one search counts it only once
+count_cache = CountCache(ttl=300, max_entries=1024)
+
+@data_version.on_change
+def clear_count_cache(version):
+    """Totals are stale once the catalog changes"""
+    count_cache.clear()
+
+async def no_count():
+    return None
+
+@app.route('/api/foods', methods=['GET'])
+async def api_foods():
+    """Search and filter foods (same parameters and response as app.py)
+
+    The total is counted by a separate query running alongside the page
+    query rather than folded into it.
+    """
+    try:
+        # Get parameters
+        search = request.args.get('search', '').strip()
+        category_id = request.args.get('category', '')
+        min_cal = request.args.get('min_cal', '')
+        max_cal = request.args.get('max_cal', '')
+        sort = request.args.get('sort', 'name')
+        cursor_token = request.args.get('cursor', '').strip()
+        use_offset = 'page' in request.args and not cursor_token
+        page = int(request.args.get('page', 1))
+        limit = 20
+        offset = (page - 1) * limit
+
+        after = None
+        try:
+            check_food_filters(category_id, min_cal, max_cal)
+            if cursor_token:
+                after = decode_cursor(cursor_token)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        filters = build_food_filters(search, category_id, min_cal, max_cal)
+        by_relevance = sort == 'relevance' and filters.score_sql is not None
+        if after and isinstance(after[0], str) == by_relevance:
+            return jsonify({'success': False, 'error': 'Cursor does not match sort order'}), 400
+
+        await current_data_version()
+        count_key = (search, category_id, min_cal, max_cal)
+        total, approximate = count_cache.get(count_key)
+
+        while True:
+            # Count on a second connection while the page query runs
+            if total is not None:
+                count_query = no_count()
+            elif filters.sql:
+                count_query = fetch_one(food_count_sql(filters), filters.params)
+            else:
+                count_query = fetch_one(f"SELECT ({FOOD_COUNT_ESTIMATE_SQL}) as total")
+                approximate = True
+
+            # One extra row tells us if more follow
+            query, params = build_food_page_query(
+                filters, after, by_relevance, limit, offset=offset if use_offset else None
+            )
+            results = await asyncio.gather(fetch_all(query, params), count_query, return_exceptions=True)
+            error = next((result for result in results if isinstance(result, Exception)), None)
+            if error is None:
+                foods, count_row = results
+                break
+            if filters.score_sql is None or not is_fulltext_error(error) or (after and by_relevance):
+                raise error
+            # The full-text statement failed; repeat the search with LIKE
+            filters = build_food_filters(search, category_id, min_cal, max_cal, fulltext=False)
+            by_relevance = False
+
+        if total is None:
+            total = int(count_row['total'] or 0)
+            count_cache.set(count_key, total, approximate)
+
+        foods, next_cursor = finish_food_page(list(foods), limit, by_relevance)
+
+        response = {
+            'success': True,
+            'foods': shape_rows(foods),
+            'total': total,
+            'total_is_approximate': approximate,
+            'limit': limit,
+            'next_cursor': next_cursor
+        }
+        if use_offset:
+            response['page'] = page
+            response['pages'] = (total + limit - 1) // limit
+        if not foods and search and after is None and offset == 0:
+            response['did_you_mean'] = await spelling_correction(search)
+        return jsonify(response)
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Prefix index over food names for type-ahead, updated as the catalog changes
+suggest_index = SuggestIndexStore(data_version)
+
+# Trigram index over catalog words for "did you mean"
+spelling_index = SpellingIndexStore(data_version)
+
+async def spelling_correction(term):
+    """Closest spelling of `term` the catalog knows, or None"""
+    index = await load_index(spelling_index)
+    return index.correct(term) if index is not None else None
+
+@app.route('/api/suggest')
+async def api_suggest():
+    """Type-ahead suggestions for a partial food name (same parameters as app.py)"""
+    try:
+        q = request.args.get('q', '')
+        limit = min(max(int(request.args.get('limit', SUGGEST_LIMIT)), 1), 25)
+
+        index = await load_index(suggest_index)
+        suggestions = index.suggest(q, limit) if index is not None else []
+
+        did_you_mean = None
+        if not suggestions and index is not None:
+            did_you_mean = await spelling_correction(q)
+            if did_you_mean:
+                suggestions = index.suggest(did_you_mean, limit)
+
+        return jsonify({'success': True, 'query': q, 'suggestions': suggestions, 'did_you_mean': did_you_mean})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/food/<int:food_id>')
+@cached_response
+async def api_food_details(food_id):
+    """Get detailed nutrition info for a food"""
+    try:
+        food = await fetch_one(FOOD_DETAIL_SQL, (food_id,))
+
+        if not food:
+            return jsonify({'success': False, 'error': 'Food not found'}), 404
+
+        return jsonify({'success': True, 'food': food})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Normalized nutrient vectors for nearest-neighbour lookups (needs NumPy)
+similarity_index = SimilarityIndexStore(data_version) if SIMILARITY_ENABLED else None
+
+@app.route('/api/food/<int:food_id>/similar')
+@cached_response
+async def api_similar_foods(food_id):
+    """Foods with the closest nutrient profile (same parameters as app.py)"""
+    if similarity_index is None:
+        return jsonify({'success': False, 'error': 'Similarity search needs NumPy (pip install numpy)'}), 503
+    try:
+        category = request.args.get('category', '').strip()
+        exact = request.args.get('exact', '') in ('1', 'true', 'yes')
+        try:
+            limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+            category_id = None if category in ('', 'same') else int(category)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid limit or category'}), 400
+
+        index = await load_index(similarity_index)
+        if index is None:
+            return jsonify({'success': False, 'error': 'Similarity index is still building'}), 503
+        try:
+            positions, distances = index.similar(
+                food_id, limit,
+                category_id=category_id, same_category=category == 'same', exact=exact
+            )
+        except KeyError:
+            return jsonify({'success': False, 'error': 'Food not found or has no nutrition facts'}), 404
+
+        return jsonify({'success': True, 'food_id': food_id, 'similar': index.rows(positions, distances)})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/foods/batch', methods=['GET', 'POST'])
+@cached_response
+async def api_foods_batch():
+    """Get details for many foods in one query"""
+    try:
+        payload = await request.get_json(silent=True) if request.method == 'POST' else None
+        values = await request.form if request.method == 'POST' and payload is None else request.args
+
+        try:
+            if payload is not None:
+                raw_ids, raw_fields = parse_batch_payload(payload)
+            else:
+                raw_ids = values.get('ids', '').split(',')
+                raw_fields = values.get('fields', '').split(',')
+            food_ids, fields = parse_batch_request(raw_ids, raw_fields)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        query, params = build_food_batch_query(food_ids, fields)
+        rows = await fetch_all(query, params)
+
+        return jsonify({'success': True, **shape_batch_result(rows, food_ids)})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/categories')
+@cached_response
+async def api_categories():
+    """Get all categories"""
+    try:
+        categories = await fetch_all(CATEGORIES_SQL)
+        return jsonify({'success': True, 'categories': categories})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/category-stats')
+@cached_response
+async def api_all_category_stats():
+    """Nutrition statistics for every category from one grouped pass"""
+    try:
+        try:
+            category_ids = parse_id_list(request.args.get('ids', ''))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'ids must be a comma-separated list of integers'}), 400
+
+        query, params = build_all_category_stats_query(category_ids)
+        stats = await fetch_all(query, params)
+
+        return jsonify({'success': True, 'stats': shape_rows(stats)})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/category-stats/<int:category_id>')
+@cached_response
+async def api_category_stats(category_id):
+    """Get category nutrition statistics"""
+    try:
+        stats = await fetch_one(CATEGORY_STATS_SQL, (category_id,))
+
+        if not stats:
+            return jsonify({'success': False, 'error': 'Category not found'}), 404
+
+        return jsonify({'success': True, 'stats': stats})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+async def stream_csv(conn, cursor, compress=False):
+    """Yield CSV bytes (optionally gzipped) as rows arrive from a server-side cursor"""
+    encoder = CsvChunkEncoder(compress)
+    finished = False
+    try:
+        rows = [[column[0] for column in cursor.description]]
+        while rows:
+            data = encoder.encode(rows)
+            if data:
+                yield data
+            rows = await cursor.fetchmany(EXPORT_CHUNK_SIZE)
+        tail = encoder.finish()
+        if tail:
+            yield tail
+        finished = True
+    finally:
+        if finished:
+            await cursor.close()
+        else:
+            # Client went away mid-export; drop the connection rather than
+            # draining the rest of the result set
+            conn.close()
+        db_pool.release(conn)
+
+@app.route('/api/export-csv', methods=['GET'])
+async def export_csv():
+    """Stream search results as CSV (gzip=1 and limit=N as in app.py)"""
+    try:
+        search = request.args.get('search', '').strip()
+        category_id = request.args.get('category', '')
+        row_limit = request.args.get('limit', '')
+        compress = request.args.get('gzip', '') in ('1', 'true', 'yes')
+
+        query, params = build_export_query(search, category_id, row_limit)
+
+        conn = await acquire_connection()
+        try:
+            cursor = await conn.cursor(aiomysql.SSCursor)
+            try:
+                await cursor.execute(query, params)
+            except Exception as e:
+                if not search or not is_fulltext_error(e):
+                    raise
+                await cursor.execute(*build_export_query(search, category_id, row_limit, fulltext=False))
+        except Exception:
+            conn.close()
+            db_pool.release(conn)
+            raise
+
+        filename = export_filename(compress, datetime.now())
+
+        response = Response(
+            stream_csv(conn, cursor, compress),
+            mimetype='application/gzip' if compress else 'text/csv',
+            headers={
+                'Content-Disposition': f'attachment; filename={filename}',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        # Large exports may outlast the default response timeout
+        response.timeout = None
+        return response
+
+    except Exception as e:
+        return f"Error: {e}", 500
+
+@app.route('/api/top-foods', methods=['GET'])
+@cached_response
+async def api_top_foods():
+    """Get top foods by various metrics (metrics=a,b or the older metric=a)"""
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+        category_id = request.args.get('category', '')
+        multi = 'metrics' in request.args
+
+        try:
+            metrics = parse_metrics(request.args.get('metrics') if multi else request.args.get('metric', 'calories'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if not metrics:
+            return jsonify({'success': False, 'error': 'Invalid metric'}), 400
+
+        query, params = build_top_foods_query(metrics, limit, category_id=category_id)
+        rows = await fetch_all(query, params)
+
+        top_foods = split_ranked_rows(rows, metrics, limit)
+
+        if multi:
+            return jsonify({'success': True, 'top_foods': {m: shape_rows(foods) for m, foods in top_foods.items()}})
+        return jsonify({'success': True, 'foods': shape_rows(top_foods[metrics[0]])})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/pool-stats')
+async def api_pool_stats():
+    """Connection pool occupancy"""
+    pool = {
+        'pool_size': db_pool.maxsize,
+        'open': db_pool.size,
+        'idle': db_pool.freesize,
+        'in_use': db_pool.size - db_pool.freesize
+    }
+    return jsonify({
+        'success': True,
+        'pool': pool,
+        'response_cache': response_cache.stats(),
+        'suggest_index': suggest_index.stats(),
+        'spelling_index': spelling_index.stats(),
+        'similarity_index': similarity_index.stats() if similarity_index else None
+    })
+
+if __name__ == '__main__':
+    # Development
+    app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark Streamlit Reruns
+Full-script rerun vs fragment rerun cost of the Comparison panel's "Add Food" click
+
+Usage:
+    streamlit run streamlit_app.py                  # in another shell, with your secrets
+    python benchmark_reruns.py                      # chicken apple salmon rice broccoli
+    python benchmark_reruns.py --rounds 3 egg oats  # your own search terms
+
+Drives a running app over its websocket the way the browser does. A
+click sent without a fragment id reruns the whole script, which is what
+each click cost while the buttons called st.rerun(); sent with the
+panel's fragment id it reruns only the fragment. Both are timed from the
+click until the server reports the run finished, each in its own fresh
+session, with the views loaded on demand and with every tab rendering.
+One unmeasured round first warms the app's caches for every term.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+DEFAULT_URL = 'http://localhost:8501'
+DEFAULT_TERMS = ['chicken', 'apple', 'salmon', 'rice', 'broccoli']
+
+
+class AppSession:
+    """One browser session on a running app"""
+
+    def __init__(self, socket, timeout):
+        self.socket = socket
+        self.timeout = timeout
+        self.page_script_hash = ''
+        self.widgets = {}  # key or label -> (widget id, fragment id)
+        self.options = {}  # widget id -> radio options
+        self.states = {}  # widget id -> WidgetState sent with every run
+
+    @classmethod
+    async def open(cls, url, timeout):
+        socket = await websocket_connect(url.rstrip('/').replace('http', 'ws', 1) + '/_stcore/stream',
+                                         connect_timeout=timeout)
+        return cls(socket, timeout)
+
+    def close(self):
+        self.socket.close()
+
+    def widget(self, name):
+        if name not in self.widgets:
+            sys.exit(f"Widget {name!r} was not rendered")
+        return self.widgets[name]
+
+    def set_state(self, name, **value):
+        widget_id = self.widget(name)[0]
+        self.states[widget_id] = WidgetState(id=widget_id, **value)
+
+    def choose(self, name, option):
+        widget_id = self.widget(name)[0]
+        self.set_state(name, int_value=self.options[widget_id].index(option))
+
+    async def run(self, click=None, fragment=False):
+        """Milliseconds until the run finishes; click is a button label, fragment reruns only its fragment"""
+        states = list(self.states.values())
+        fragment_id = ''
+        if click:
+            widget_id, fragment_id = self.widget(click)
+            states.append(WidgetState(id=widget_id, trigger_value=True))
+        msg = BackMsg()
+        msg.rerun_script.query_string = ''
+        msg.rerun_script.page_script_hash = self.page_script_hash
+        msg.rerun_script.widget_states.widgets.extend(states)
+        if fragment:
+            msg.rerun_script.fragment_id = fragment_id
+
+        started = time.perf_counter()
+        await self.socket.write_message(msg.SerializeToString(), binary=True)
+        while True:
+            data = await asyncio.wait_for(self.socket.read_message(), self.timeout)
+            if data is None:
+                sys.exit("The app closed the connection")
+            forward = ForwardMsg.FromString(data)
+            kind = forward.WhichOneof('type')
+            if kind == 'new_session':
+                self.page_script_hash = forward.new_session.page_script_hash
+            elif kind == 'delta':
+                self.record(forward.delta)
+            elif kind == 'script_finished':
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    sys.exit("App script failed to compile")
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if fragment and forward.script_finished != ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY:
+                    sys.exit(f"{click!r} did not rerun as a fragment")
+                return (time.perf_counter() - started) * 1000
+
+    def record(self, delta):
+        """Note the ids of rendered widgets and stop on an app exception or st.error()"""
+        if delta.WhichOneof('type') != 'new_element':
+            return
+        element_type = delta.new_element.WhichOneof('type')
+        element = getattr(delta.new_element, element_type)
+        if element_type == 'exception':
+            sys.exit(f"App raised {element.type}: {element.message}")
+        if element_type == 'alert' and element.format == Alert.ERROR:
+            sys.exit(f"App reported an error: {element.body}")
+        widget_id = getattr(element, 'id', '')
+        if not widget_id:
+            return
+        if getattr(element, 'label', ''):
+            self.widgets[element.label] = (widget_id, delta.fragment_id)
+        # Widgets with a key get ids of the form $$WIDGET_ID-<hash>-<key>
+        key = widget_id.split('-', 2)[-1]
+        if key != 'None':
+            self.widgets[key] = (widget_id, delta.fragment_id)
+        if element_type == 'radio':
+            self.options[widget_id] = list(element.options)
+
+
+async def measure(url, terms, lazy_views, fragment, timeout):
+    """Milliseconds for one "Add Food" click per term in a fresh session"""
+    session = await AppSession.open(url, timeout)
+    try:
+        await session.run()
+        session.set_state('lazy_views', bool_value=lazy_views)
+        if lazy_views:
+            session.choose('active_view', 'Comparison')
+        await session.run()
+
+        runs = []
+        for idx, term in enumerate(terms):
+            session.set_state('comp_search', string_value=term)
+            runs.append(await session.run(click='Add Food', fragment=fragment))
+            if f'remove_comp_{idx}' not in session.widgets:
+                sys.exit(f"No new food was added for {term!r}")
+        return runs
+    finally:
+        session.close()
+
+
+async def benchmark(args):
+    print(f"{'Mode':<18}{'Clicks':>8}{'Full rerun (ms)':>18}{'Fragment rerun (ms)':>22}{'Saved':>8}")
+    for label, lazy_views in (('views on demand', True), ('all tabs', False)):
+        await measure(args.url, args.terms, lazy_views, False, args.timeout)
+        full_runs, fragment_runs = [], []
+        for _ in range(args.rounds):
+            full_runs += await measure(args.url, args.terms, lazy_views, False, args.timeout)
+            fragment_runs += await measure(args.url, args.terms, lazy_views, True, args.timeout)
+        full_ms = statistics.median(full_runs)
+        fragment_ms = statistics.median(fragment_runs)
+        saved = 1 - fragment_ms / full_ms if full_ms else 0.0
+        print(f"{label:<18}{len(full_runs):>8}{full_ms:>18.1f}{fragment_ms:>22.1f}{saved:>8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time full-script vs fragment reruns in a running streamlit_app.py")
+    parser.add_argument('terms', nargs='*', default=DEFAULT_TERMS,
+                        help="Foods added to the comparison, one click each")
+    parser.add_argument('--url', default=DEFAULT_URL, help="Address of the running app")
+    parser.add_argument('--rounds', type=int, default=3, help="Fresh sessions per mode and rerun scope")
+    parser.add_argument('--timeout', type=float, default=60, help="Seconds allowed per script run")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""
+Catalog Queries
+SQL and result shaping shared by the Flask (app.py), ASGI (async_app.py) and Streamlit dashboards
+"""
+
+import base64
+import csv
+import json
+import math
+import threading
+import time
+import zlib
+from collections import namedtuple
+from io import StringIO
+
+from food_search import search_filter
+
+# ============================================================================
+# DASHBOARD AND CATALOG LOOKUPS
+# ============================================================================
+
+INDEX_STATS_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM food_categories) as categories,
+        (SELECT COUNT(*) FROM foods) as foods,
+        (SELECT COUNT(*) FROM nutrition_facts) as nutrition_records
+"""
+
+INDEX_CATEGORIES_SQL = "SELECT category_id, name FROM food_categories ORDER BY name"
+
+CATEGORIES_SQL = """
+    SELECT
+        fc.category_id,
+        fc.name,
+        COUNT(f.food_id) as food_count
+    FROM food_categories fc
+    LEFT JOIN foods f ON fc.category_id = f.category_id
+    GROUP BY fc.category_id, fc.name
+    ORDER BY fc.name
+"""
+
+FOOD_DETAIL_SQL = """
+    SELECT
+        f.food_id,
+        f.name,
+        f.description,
+        f.brand,
+        fc.name as category,
+        f.serving_size,
+        f.serving_weight_g,
+        nf.*
+    FROM foods f
+    JOIN food_categories fc ON f.category_id = fc.category_id
+    LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
+    WHERE f.food_id = %s
+"""
+
+CATEGORY_STATS_SQL = """
+    SELECT
+        fc.name as category,
+        COUNT(nf.nutrition_id) as total_foods,
+        ROUND(AVG(nf.calories), 2) as avg_calories,
+        ROUND(AVG(nf.protein_g), 2) as avg_protein,
+        ROUND(AVG(nf.fat_g), 2) as avg_fat,
+        ROUND(AVG(nf.carbohydrates_g), 2) as avg_carbs,
+        ROUND(AVG(nf.fiber_g), 2) as avg_fiber,
+        ROUND(MAX(nf.calories), 2) as max_calories,
+        ROUND(MIN(nf.calories), 2) as min_calories
+    FROM food_categories fc
+    LEFT JOIN foods f ON fc.category_id = f.category_id
+    LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
+    WHERE fc.category_id = %s AND nf.calories IS NOT NULL
+    GROUP BY fc.category_id, fc.name
+"""
+
+
+def check_food_filters(category_id, min_cal, max_cal):
+    """Raise ValueError unless the food list filters are a valid id and finite numbers"""
+    if category_id:
+        try:
+            int(category_id)
+        except ValueError:
+            raise ValueError('category must be an integer id') from None
+    for name, value in (('min_cal', min_cal), ('max_cal', max_cal)):
+        if value:
+            try:
+                number = float(value)
+            except ValueError:
+                number = None
+            if number is None or not math.isfinite(number):
+                raise ValueError(f'{name} must be a number')
+
+
+def parse_id_list(value):
+    """Parse a comma-separated id list ("1,2,3") into ints"""
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def build_all_category_stats_query(category_ids=None):
+    """Avg/min/max nutrition for every category (or just category_ids) in one GROUP BY"""
+    query = """
+        SELECT
+            fc.category_id,
+            fc.name as category,
+            COUNT(nf.nutrition_id) as total_foods,
+            ROUND(AVG(nf.calories), 2) as avg_calories,
+            ROUND(AVG(nf.protein_g), 2) as avg_protein,
+            ROUND(AVG(nf.fat_g), 2) as avg_fat,
+            ROUND(AVG(nf.carbohydrates_g), 2) as avg_carbs,
+            ROUND(AVG(nf.fiber_g), 2) as avg_fiber,
+            ROUND(MIN(nf.calories), 2) as min_calories,
+            ROUND(MAX(nf.calories), 2) as max_calories,
+            ROUND(MIN(nf.protein_g), 2) as min_protein,
+            ROUND(MAX(nf.protein_g), 2) as max_protein,
+            ROUND(MIN(nf.fat_g), 2) as min_fat,
+            ROUND(MAX(nf.fat_g), 2) as max_fat,
+            ROUND(MIN(nf.carbohydrates_g), 2) as min_carbs,
+            ROUND(MAX(nf.carbohydrates_g), 2) as max_carbs,
+            ROUND(MIN(nf.fiber_g), 2) as min_fiber,
+            ROUND(MAX(nf.fiber_g), 2) as max_fiber
+        FROM nutrition_facts nf
+        JOIN foods f ON nf.food_id = f.food_id
+        JOIN food_categories fc ON f.category_id = fc.category_id
+        WHERE nf.calories IS NOT NULL
+    """
+
+    params = []
+    if category_ids:
+        query += f" AND f.category_id IN ({', '.join(['%s'] * len(category_ids))})"
+        params.extend(category_ids)
+
+    query += " GROUP BY fc.category_id, fc.name ORDER BY fc.name"
+    return query, params
+
+# ============================================================================
+# BATCH FOOD DETAILS
+# ============================================================================
+
+# Columns a batch lookup may project, by response key
+FOOD_DETAIL_COLUMNS = {
+    'description': 'f.description',
+    'brand': 'f.brand',
+    'category': 'fc.name',
+    'serving_size': 'f.serving_size',
+    'serving_weight_g': 'f.serving_weight_g'
+}
+NUTRIENT_COLUMNS = [
+    'calories', 'protein_g', 'carbohydrates_g', 'fiber_g', 'sugar_g', 'fat_g',
+    'saturated_fat_g', 'cholesterol_mg', 'sodium_mg', 'potassium_mg', 'calcium_mg',
+    'iron_mg', 'magnesium_mg', 'phosphorus_mg', 'zinc_mg', 'vitamin_a_iu',
+    'vitamin_c_mg', 'vitamin_d_iu', 'vitamin_e_mg', 'vitamin_k_mg', 'thiamine_mg',
+    'riboflavin_mg', 'niacin_mg', 'pantothenic_acid_mg', 'folate_mcg',
+    'vitamin_b12_mcg', 'caffeine_mg'
+]
+FOOD_DETAIL_COLUMNS.update({name: f'nf.{name}' for name in NUTRIENT_COLUMNS})
+MAX_BATCH_IDS = 1000
+
+
+def parse_batch_payload(payload):
+    """(raw ids, raw fields) from a JSON batch body; raises ValueError with a client message"""
+    if not isinstance(payload, dict):
+        raise ValueError('Request body must be a JSON object')
+    raw_ids = payload.get('ids', [])
+    raw_fields = payload.get('fields', [])
+    if not isinstance(raw_ids, list):
+        raise ValueError('ids must be a list')
+    if not isinstance(raw_fields, list) or not all(isinstance(f, str) for f in raw_fields):
+        raise ValueError('fields must be a list of field names')
+    return raw_ids, raw_fields
+
+
+def parse_batch_request(raw_ids, raw_fields):
+    """Validate batch ids and field projection; raises ValueError with a client message"""
+    try:
+        food_ids = list(dict.fromkeys(int(i) for i in raw_ids if str(i).strip()))
+    except (TypeError, ValueError):
+        raise ValueError('ids must be integers')
+    if not food_ids:
+        raise ValueError('No ids given')
+    if len(food_ids) > MAX_BATCH_IDS:
+        raise ValueError(f'At most {MAX_BATCH_IDS} ids per request')
+
+    fields = [f.strip() for f in raw_fields if f and f.strip()] or list(FOOD_DETAIL_COLUMNS)
+    unknown = [f for f in fields if f not in FOOD_DETAIL_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return food_ids, list(dict.fromkeys(fields))
+
+
+def build_food_batch_query(food_ids, fields):
+    """One WHERE food_id IN (...) lookup projecting only `fields`"""
+    columns = ",\n            ".join(f"{FOOD_DETAIL_COLUMNS[field]} as {field}" for field in fields)
+    query = f"""
+        SELECT
+            f.food_id,
+            f.name,
+            {columns}
+        FROM foods f
+        JOIN food_categories fc ON f.category_id = fc.category_id
+        LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
+        WHERE f.food_id IN ({', '.join(['%s'] * len(food_ids))})
+    """
+    return query, list(food_ids)
+
+
+def shape_batch_result(rows, food_ids):
+    """Key rows by id in request order and list the ids that were not found"""
+    foods = {row['food_id']: row for row in rows}
+    return {
+        'foods': {str(food_id): foods[food_id] for food_id in food_ids if food_id in foods},
+        'missing': [food_id for food_id in food_ids if food_id not in foods]
+    }
+
+# ============================================================================
+# FOOD LIST (SEARCH, FILTERS, KEYSET PAGING)
+# ============================================================================
+
+FoodFilters = namedtuple('FoodFilters', 'sql params needs_nutrition score_sql score_params')
+
+# Columns of a food list row, as selected by build_food_page_query
+FOOD_LIST_COLUMNS = [
+    'food_id', 'name', 'category', 'calories', 'protein_g', 'fat_g',
+    'carbohydrates_g', 'fiber_g', 'sodium_mg', 'sugar_g'
+]
+
+FOOD_COUNT_ESTIMATE_SQL = """SELECT TABLE_ROWS FROM information_schema.TABLES
+                 WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'foods'"""
+
+
+def encode_cursor(sort_value, food_id):
+    """Opaque continuation token for the (sort value, food_id) sort key"""
+    raw = json.dumps([sort_value, food_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a continuation token back into (sort value, food_id)"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        sort_value, food_id = json.loads(raw)
+        if not isinstance(sort_value, (str, int, float)) or not isinstance(food_id, int):
+            raise ValueError
+        return sort_value, food_id
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def build_food_filters(search, category_id, min_cal, max_cal, fulltext=True):
+    """WHERE fragment and params for the food list filters
+
+    The fragment references only `f` and, when needs_nutrition is set,
+    `nf`. score_sql is the full-text relevance expression, or None when
+    there is no search term or it fell back to LIKE (always, with
+    fulltext=False).
+    """
+    sql, params, score_sql, score_params = search_filter(search, fulltext)
+
+    if category_id:
+        sql += " AND f.category_id = %s"
+        params.append(category_id)
+
+    if min_cal:
+        sql += " AND nf.calories >= %s"
+        params.append(min_cal)
+
+    if max_cal:
+        sql += " AND nf.calories <= %s"
+        params.append(max_cal)
+
+    return FoodFilters(sql, params, bool(min_cal or max_cal), score_sql, score_params)
+
+
+def food_count_sql(filters):
+    """Lean COUNT over the food filters, joining only what they reference"""
+    join = " LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id" if filters.needs_nutrition else ""
+    return f"SELECT COUNT(*) as total FROM foods f{join} WHERE 1=1{filters.sql}"
+
+
+def food_count_column(filters, after=None):
+    """Select-list expression that folds the total into the page query
+
+    Table statistics when unfiltered, a window count over the same scan on
+    the first page, or a lean scalar count behind a cursor. Returns
+    (sql, params, approximate).
+    """
+    if not filters.sql:
+        return f"({FOOD_COUNT_ESTIMATE_SQL})", [], True
+    if after is None:
+        return "COUNT(*) OVER ()", [], False
+    return f"({food_count_sql(filters)})", list(filters.params), False
+
+
+def build_food_page_query(filters, after=None, by_relevance=False, limit=20, offset=None,
+                          count_column="", count_params=()):
+    """One page of the food list, plus one extra row to detect a next page
+
+    `after` is a decoded cursor to seek past; `offset` selects legacy OFFSET
+    paging instead. `count_column` is an optional extra select-list column
+    (named total_matches) carrying the total.
+    """
+    params = []
+    relevance_column = ""
+    if by_relevance:
+        relevance_column = f",\n            {filters.score_sql} as relevance"
+        params.extend(filters.score_params)
+    if count_column:
+        count_column = f",\n            {count_column} as total_matches"
+        params.extend(count_params)
+
+    query = f"""
+        SELECT
+            f.food_id,
+            f.name,
+            fc.name as category,
+            nf.calories,
+            nf.protein_g,
+            nf.fat_g,
+            nf.carbohydrates_g,
+            nf.fiber_g,
+            nf.sodium_mg,
+            nf.sugar_g{relevance_column}{count_column}
+        FROM foods f
+        JOIN food_categories fc ON f.category_id = fc.category_id
+        LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
+        WHERE 1=1{filters.sql}
+    """
+    params.extend(filters.params)
+
+    # Seek past the previous page instead of scanning and discarding it
+    if after and by_relevance:
+        score_sql = filters.score_sql
+        query += f" AND ({score_sql} < %s OR ({score_sql} = %s AND f.food_id > %s))"
+        params.extend(filters.score_params + [after[0]] + filters.score_params + [after[0], after[1]])
+    elif after:
+        query += " AND (f.name > %s OR (f.name = %s AND f.food_id > %s))"
+        params.extend([after[0], after[0], after[1]])
+
+    if by_relevance:
+        query += " ORDER BY relevance DESC, f.food_id"
+    else:
+        query += " ORDER BY f.name, f.food_id"
+    # Bound rather than inlined, so every page shares one statement shape
+    if offset is not None:
+        query += " LIMIT %s OFFSET %s"
+        params.extend([limit + 1, int(offset)])
+    else:
+        query += " LIMIT %s"
+        params.append(limit + 1)
+    return query, params
+
+
+def finish_food_page(foods, limit, by_relevance):
+    """Trim the look-ahead row and build the next cursor; returns (foods, next_cursor)"""
+    has_more = len(foods) > limit
+    foods = foods[:limit]
+    next_cursor = None
+    if has_more:
+        sort_value = foods[-1]['relevance'] if by_relevance else foods[-1]['name']
+        next_cursor = encode_cursor(sort_value, foods[-1]['food_id'])
+    return foods, next_cursor
+
+
+class CountCache:
+    """Per-filter result counts, so paging through one search counts it only once"""
+
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key):
+        """Return (total, approximate) for a filter, or (None, False) if not cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[2] < self.ttl:
+                return entry[0], entry[1]
+        return None, False
+
+    def set(self, key, total, approximate):
+        """Remember a filter's total, evicting the oldest entry when full"""
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (total, approximate, time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# ============================================================================
+# STREAMLIT SEARCH
+# ============================================================================
+
+# Nutrient range filters, always added in this order so a given set of
+# filters produces the same statement text every time
+SEARCH_RANGE_COLUMNS = ['calories', 'protein_g', 'fiber_g', 'sodium_mg']
+
+SEARCH_RESULT_LIMIT = 500
+
+
+def _search_select(score_sql=None):
+    """SELECT and joins for Streamlit search rows, with a relevance column when scored"""
+    relevance_column = f", {score_sql} as relevance" if score_sql else ""
+    return f"""
+        SELECT
+            f.food_id,
+            f.name,
+            f.brand,
+            f.serving_size,
+            fc.name as category,
+            nf.calories,
+            nf.protein_g,
+            nf.fat_g,
+            nf.carbohydrates_g,
+            nf.fiber_g,
+            nf.sodium_mg,
+            nf.sugar_g{relevance_column}
+        FROM foods f
+        JOIN food_categories fc ON f.category_id = fc.category_id
+        LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
+    """
+
+
+def build_search_query(search, category_id, ranges, limit=SEARCH_RESULT_LIMIT, fulltext=True):
+    """Streamlit search: term, category and nutrient ranges, best matches first
+
+    ranges maps a SEARCH_RANGE_COLUMNS column to (min, max); either bound
+    may be None.
+    """
+    search_sql, search_params, score_sql, score_params = search_filter(search, fulltext)
+    query = _search_select(score_sql) + f"WHERE 1=1{search_sql}"
+    params = list(score_params) + search_params
+
+    if category_id:
+        query += " AND fc.category_id = %s"
+        params.append(category_id)
+
+    for column in SEARCH_RANGE_COLUMNS:
+        low, high = ranges.get(column, (None, None))
+        if low is not None:
+            query += f" AND nf.{column} >= %s"
+            params.append(low)
+        if high is not None:
+            query += f" AND nf.{column} <= %s"
+            params.append(high)
+
+    if score_sql:
+        query += " ORDER BY relevance DESC, f.name LIMIT %s"
+    else:
+        query += " ORDER BY f.name LIMIT %s"
+    params.append(limit)
+    return query, params
+
+
+def like_prefix(term):
+    """LIKE pattern matching values that start with term (wildcards in term escaped)"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def build_best_match_queries(term, fulltext=True):
+    """Single-row lookups for the food a typed name means, most specific first
+
+    Returns [(query, params)]: exact name, then name prefix (both read
+    idx_name in order and stop at the first row), then full-text
+    relevance. Run them in order and keep the first row found.
+    """
+    term = term.strip()
+    if not term:
+        return []
+    queries = [
+        (_search_select() + "WHERE f.name = %s ORDER BY f.food_id LIMIT 1", [term]),
+        (_search_select() + "WHERE f.name LIKE %s ORDER BY f.name, f.food_id LIMIT 1", [like_prefix(term)])
+    ]
+
+    # Ranked in ORDER BY only, so this row has the same keys as the other two
+    search_sql, search_params, score_sql, score_params = search_filter(term, fulltext)
+    query = _search_select() + f"WHERE 1=1{search_sql}"
+    params = list(search_params)
+    if score_sql:
+        query += f" ORDER BY {score_sql} DESC, f.name LIMIT 1"
+        params += score_params
+    else:
+        query += " ORDER BY f.name LIMIT 1"
+    queries.append((query, params))
+    return queries
+
+# ============================================================================
+# CSV EXPORT
+# ============================================================================
+
+# Rows pulled from the server per round trip while streaming an export
+EXPORT_CHUNK_SIZE = 1000
+
+
+def build_export_query(search, category_id, row_limit=None, fulltext=True):
+    """Export query; no row cap unless row_limit is given"""
+    query = """
+        SELECT
+            f.name,
+            fc.name as category,
+            nf.calories,
+            nf.protein_g,
+            nf.fat_g,
+            nf.carbohydrates_g,
+            nf.fiber_g,
+            nf.sugar_g,
+            nf.sodium_mg,
+            nf.cholesterol_mg,
+            nf.calcium_mg,
+            nf.iron_mg,
+            nf.vitamin_c_mg
+        FROM foods f
+        JOIN food_categories fc ON f.category_id = fc.category_id
+        LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
+        WHERE 1=1
+    """
+
+    params = []
+
+    search_sql, search_params, _, _ = search_filter(search, fulltext)
+    query += search_sql
+    params.extend(search_params)
+
+    if category_id:
+        query += " AND fc.category_id = %s"
+        params.append(category_id)
+
+    query += " ORDER BY f.name"
+
+    if row_limit:
+        query += " LIMIT %s"
+        params.append(int(row_limit))
+
+    return query, params
+
+
+class CsvChunkEncoder:
+    """Turns batches of row tuples into CSV bytes, optionally gzipped on the fly"""
+
+    def __init__(self, compress=False):
+        self._buffer = StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def encode(self, rows):
+        self._writer.writerows(rows)
+        data = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        if self._compressor:
+            data = self._compressor.compress(data)
+        return data
+
+    def finish(self):
+        return self._compressor.flush() if self._compressor else b''
+
+
+def export_filename(compress, now):
+    filename = f'nutrition_data_{now.strftime("%Y%m%d_%H%M%S")}.csv'
+    return filename + '.gz' if compress else filename
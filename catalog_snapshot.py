@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Catalog Snapshot
+In-memory columnar copy of the food catalog for filter-only queries
+"""
+
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from data_version import VersionedIndexStore
+
+# Set CATALOG_SNAPSHOT=0 to always query MySQL
+SNAPSHOT_ENABLED = np is not None and os.environ.get('CATALOG_SNAPSHOT', '1') not in ('0', 'false', 'no')
+# Catalogs larger than this stay in the database
+SNAPSHOT_MAX_ROWS = int(os.environ.get('CATALOG_SNAPSHOT_MAX_ROWS', 250000))
+
+NUMERIC_COLUMNS = ['calories', 'protein_g', 'fat_g', 'carbohydrates_g', 'fiber_g', 'sodium_mg', 'sugar_g']
+TEXT_COLUMNS = ['name', 'brand', 'serving_size', 'category']
+
+# Loaded in the same (name, food_id) order the list endpoints sort by, so
+# a row's position is its rank under the server's collation
+SNAPSHOT_SQL = """
+    SELECT
+        f.food_id,
+        f.category_id,
+        f.name,
+        f.brand,
+        f.serving_size,
+        fc.name as category,
+        nf.calories,
+        nf.protein_g,
+        nf.fat_g,
+        nf.carbohydrates_g,
+        nf.fiber_g,
+        nf.sodium_mg,
+        nf.sugar_g
+    FROM foods f
+    JOIN food_categories fc ON f.category_id = fc.category_id
+    LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
+    ORDER BY f.name, f.food_id
+"""
+
+
+class CatalogSnapshot:
+    """Immutable column arrays of the catalog at one data version"""
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.size = len(rows)
+        columns = list(zip(*rows)) if rows else [()] * (2 + len(TEXT_COLUMNS) + len(NUMERIC_COLUMNS))
+
+        self.food_id = np.array(columns[0], dtype=np.int64)
+        self.category_id = np.array(columns[1], dtype=np.int64)
+        self.text = {
+            name: np.array(values, dtype=object)
+            for name, values in zip(TEXT_COLUMNS, columns[2:2 + len(TEXT_COLUMNS)])
+        }
+        # NULL nutrition values become NaN, which fails every range comparison
+        # just as NULL does in SQL
+        self.numeric = {
+            name: np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+            for name, values in zip(NUMERIC_COLUMNS, columns[2 + len(TEXT_COLUMNS):])
+        }
+        self._position = {food_id: i for i, food_id in enumerate(columns[0])}
+
+    def select(self, category_id=None, ranges=None):
+        """Positions, in name order, of foods passing the category and range filters
+
+        ranges maps a numeric column to (min, max); either bound may be None.
+        """
+        mask = np.ones(self.size, dtype=bool)
+        if category_id:
+            mask &= self.category_id == int(category_id)
+        for column, (low, high) in (ranges or {}).items():
+            values = self.numeric[column]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return np.flatnonzero(mask)
+
+    def page(self, category_id=None, ranges=None, after_food_id=None, offset=0, limit=20):
+        """One page (plus a look-ahead row) of the filtered foods and the total
+
+        after_food_id continues past a keyset cursor; raises KeyError when
+        that food is not in the snapshot.
+        """
+        positions = self.select(category_id, ranges)
+        start = offset or 0
+        if after_food_id is not None:
+            start = int(np.searchsorted(positions, self._position[after_food_id], side='right'))
+        return positions[start:start + limit + 1], len(positions)
+
+    def rows(self, positions, columns):
+        """Materialize rows at `positions` as dicts of the requested columns"""
+        data = {'food_id': self.food_id[positions].tolist(), 'category_id': self.category_id[positions].tolist()}
+        for name in columns:
+            if name in self.text:
+                data[name] = self.text[name][positions].tolist()
+            elif name in self.numeric:
+                data[name] = [None if v != v else v for v in self.numeric[name][positions].tolist()]
+        return [dict(zip(columns, values)) for values in zip(*(data[name] for name in columns))]
+
+
+class CatalogSnapshotStore(VersionedIndexStore):
+    """Holds the current snapshot and swaps in a rebuilt one when the data version moves
+
+    get() returns None when the snapshot cannot serve: still building, or
+    the catalog has outgrown max_rows.
+    """
+
+    def __init__(self, tracker, max_rows=SNAPSHOT_MAX_ROWS):
+        super().__init__(tracker, SNAPSHOT_SQL, CatalogSnapshot)
+        self.max_rows = max_rows
+        self._too_large_at = None  # data version at which the catalog outgrew max_rows
+
+    def is_current(self, index, version):
+        return version == self._too_large_at or super().is_current(index, version)
+
+    def build(self, cursor, version, previous):
+        cursor.execute("SELECT COUNT(*) FROM foods")
+        if cursor.fetchone()[0] > self.max_rows:
+            self._too_large_at = version
+            return None
+        return super().build(cursor, version, previous)
+
+    def stats(self):
+        snapshot = self._index
+        return {
+            'too_large': self._too_large_at is not None,
+            'rows': snapshot.size if snapshot else 0,
+            'version': list(snapshot.version) if snapshot else None
+        }
@@ -3,6 +3,8 @@
 
 import mysql.connector
 
+from data_version import ensure_version_table, bump_data_version
+
 DB_CONFIG = {
     'host': '82.197.82.46',
     'user': 'u280406916_nutrition',
@@ -15,6 +17,9 @@ try:
     conn = mysql.connector.connect(**DB_CONFIG)
     cursor = conn.cursor()
     
+    # DDL commits implicitly; run it before the deletes so they stay one transaction
+    ensure_version_table(cursor)
+    
     print("🗑️  Clearing old food data...")
     
     # Delete in correct order (respecting foreign keys)
@@ -27,6 +32,9 @@ try:
     cursor.execute("DELETE FROM food_categories")
     print(f"   Deleted food_categories")
     
+    # Let the dashboards drop their cached catalog data
+    bump_data_version(cursor)
+    
     conn.commit()
     print("✅ All food data cleared successfully!")
     
@@ -34,4 +42,9 @@ try:
     conn.close()
     
 except Exception as e:
-    print(f"❌ ERROR: {e}")
\ No newline at end of file
+    print(f"❌ ERROR: {e}")
+    try:
+        conn.rollback()
+        print("   Nothing was deleted")
+    except Exception:
+        pass
\ No newline at end of file
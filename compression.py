@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Response Compression
+Accept-Encoding negotiation and gzip/brotli bodies for API responses
+"""
+
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this go out as-is; compressing them costs more than it saves
+MIN_COMPRESS_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'text/html', 'text/csv', 'text/plain', 'text/css', 'application/javascript'
+}
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, or None for identity"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+
+    best = None
+    for encoding in supported_encodings():
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (encoding, q)
+    return best[0] if best else None
+
+
+def should_compress(status_code, mimetype, headers, length):
+    return (
+        status_code == 200
+        and mimetype in COMPRESSIBLE_TYPES
+        and 'Content-Encoding' not in headers
+        and length >= MIN_COMPRESS_SIZE
+    )
+
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressedBodyCache:
+    """Compressed variants of ETagged bodies, so cached responses are compressed once"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def compress(self, body, encoding, etag=None):
+        if not etag:
+            return compress_body(body, encoding)
+
+        key = (etag, encoding)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        data = compress_body(body, encoding)
+        with self._lock:
+            self._entries[key] = data
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return data
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Catalog Data Version
+Cheap change detection for caches built on foods / nutrition_facts
+"""
+
+import threading
+import time
+
+import mysql.connector
+
+ER_NO_SUCH_TABLE = 1146
+
+CREATE_VERSION_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS catalog_version (
+        id TINYINT PRIMARY KEY,
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+"""
+
+# Both MAX() lookups are answered from the updated_at indexes
+DATA_VERSION_SQL = """
+    SELECT
+        (SELECT MAX(updated_at) FROM foods) as foods_updated,
+        (SELECT MAX(updated_at) FROM nutrition_facts) as nutrition_updated,
+        (SELECT version FROM catalog_version WHERE id = 1) as catalog_version
+"""
+
+DATA_VERSION_FALLBACK_SQL = """
+    SELECT
+        (SELECT MAX(updated_at) FROM foods) as foods_updated,
+        (SELECT MAX(updated_at) FROM nutrition_facts) as nutrition_updated,
+        NULL as catalog_version
+"""
+
+
+def ensure_version_table(cursor):
+    """Create catalog_version if it is missing
+
+    CREATE TABLE commits implicitly, so call this before the writes that
+    bump_data_version() should be part of, never between them.
+    """
+    cursor.execute(CREATE_VERSION_TABLE_SQL)
+
+
+def bump_data_version(cursor):
+    """Mark the catalog as changed (call after imports and bulk deletes)
+
+    Runs in the caller's transaction, so the bump commits or rolls back
+    with the changes it announces. The table must already exist (schema.sql
+    or ensure_version_table()).
+    """
+    cursor.execute("""
+        INSERT INTO catalog_version (id, version) VALUES (1, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """)
+
+
+def fetch_data_version(cursor):
+    """Current catalog version as a comparable tuple"""
+    try:
+        cursor.execute(DATA_VERSION_SQL)
+    except mysql.connector.Error as e:
+        # Databases that predate catalog_version still get updated_at tracking
+        if e.errno != ER_NO_SUCH_TABLE:
+            raise
+        cursor.execute(DATA_VERSION_FALLBACK_SQL)
+    return version_from_row(cursor.fetchone())
+
+
+def version_from_row(row):
+    """Normalize a DATA_VERSION_SQL row (tuple or dict) into a version tuple"""
+    if isinstance(row, dict):
+        row = (row['foods_updated'], row['nutrition_updated'], row['catalog_version'])
+    return tuple(str(value) for value in row)
+
+
+class DataVersionTracker:
+    """Polls the catalog version at most once per check_interval seconds
+
+    Callbacks registered with on_change() run whenever a poll sees a
+    different version than the last one.
+    """
+
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._callbacks = []
+
+    def on_change(self, callback):
+        self._callbacks.append(callback)
+        return callback
+
+    def current(self, get_conn):
+        """Return the catalog version, querying through get_conn() only when due"""
+        version = self.peek()
+        if version is not None:
+            return version
+
+        cursor = get_conn().cursor()
+        try:
+            version = fetch_data_version(cursor)
+        finally:
+            cursor.close()
+        return self.record(version)
+
+    def peek(self):
+        """Return the last polled version, or None when a new poll is due"""
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._version
+        return None
+
+    def record(self, version):
+        """Store a freshly polled version (for callers that query it themselves)"""
+        with self._lock:
+            changed = self._version is not None and version != self._version
+            self._version = version
+            self._checked_at = time.monotonic()
+
+        if changed:
+            for callback in self._callbacks:
+                callback(version)
+        return version
+
+    def invalidate(self):
+        """Force the next current() call to re-query"""
+        with self._lock:
+            self._checked_at = 0.0
+
+
+class VersionedIndexStore:
+    """Holds an in-memory index built from the catalog, rebuilt when the data version moves
+
+    build_fn(rows, version) makes the index from the rows of query;
+    subclasses with other loading needs override build() instead. Only one
+    caller rebuilds; the others keep reading the previous index until the
+    new one replaces it in a single assignment.
+    """
+
+    def __init__(self, tracker, query=None, build_fn=None):
+        self.tracker = tracker
+        self.query = query
+        self.build_fn = build_fn
+        self._index = None
+        self._build_lock = threading.Lock()
+
+    def get(self, get_conn):
+        """Index for the current data version (None until the first build finishes)"""
+        version = self.tracker.current(get_conn)
+        index = self._index
+        if self.is_current(index, version):
+            return index
+
+        if not self._build_lock.acquire(blocking=False):
+            return index
+        try:
+            cursor = get_conn().cursor()
+            try:
+                index = self.build(cursor, version, index)
+            finally:
+                cursor.close()
+            self._index = index
+            return index
+        finally:
+            self._build_lock.release()
+
+    def is_current(self, index, version):
+        """Whether index can serve version without a rebuild"""
+        return index is not None and index.version == version
+
+    def build(self, cursor, version, previous):
+        """New index for version (previous is the one being replaced, or None)"""
+        cursor.execute(self.query)
+        return self.build_fn(cursor.fetchall(), version)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Database Configuration
+Connection and pool settings shared by the Flask and async dashboards
+"""
+
+import os
+
+# Database configuration
+DB_CONFIG = {
+    'host': '82.197.82.46',
+    'user': 'u280406916_nutrition',
+    'password': 'Mutsokoti08@',
+    'database': 'u280406916_nutrition',
+    'port': 3306
+}
+
+# Connection pool settings (overridable from the environment)
+POOL_CONFIG = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+    'checkout_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+    'idle_timeout': float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+    'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+    'validate_after': float(os.environ.get('DB_POOL_VALIDATE_AFTER', 30))
+}
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Database Connection Pool
+Bounded, health-checked MySQL connection pooling with scrapeable stats
+"""
+
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection frees up within the checkout timeout"""
+
+
+class PooledConnection:
+    """Proxy for a pooled connection; close() hands it back to the pool"""
+
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+
+    @property
+    def released(self):
+        return self._conn is None
+
+    @property
+    def driver_connection(self):
+        """The underlying connection, for state that outlives this checkout"""
+        return self._conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise mysql.connector.errors.OperationalError("Connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._release(conn, self._created_at)
+
+    def discard(self):
+        """Drop the connection instead of returning it (for one abandoned mid-result)
+
+        Unlike close(), nothing is read from the server first, so unread
+        rows of an unbuffered result are never pulled in.
+        """
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._drop(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Thread-safe pool of MySQL connections
+
+    - pool_size: hard cap on open connections (idle + checked out)
+    - checkout_timeout: seconds to wait for a free connection before failing
+    - idle_timeout: idle connections older than this are closed
+    - max_lifetime: connections older than this are replaced on return
+    - validate_after: connections idle longer than this are pinged on checkout
+    """
+
+    def __init__(self, db_config, pool_size=10, checkout_timeout=5.0,
+                 idle_timeout=300.0, max_lifetime=3600.0, validate_after=30.0):
+        self.db_config = dict(db_config)
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.validate_after = validate_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, created_at, last_used), oldest on the left
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._validation_failures = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.db_config)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _drop(self, conn):
+        """Take a checked-out connection out of the pool and cut it off without a rollback"""
+        with self._cond:
+            self._in_use -= 1
+            self._open -= 1
+            self._cond.notify()
+        try:
+            # shutdown() closes the socket without QUIT; close() and rollback()
+            # would first read any unread result to the end
+            shutdown = getattr(conn, 'shutdown', None)
+            if shutdown is not None:
+                shutdown()
+            else:
+                conn.close()
+        except Exception:
+            pass
+
+    def _reap_idle(self, now):
+        """Pop expired idle connections; caller holds the lock and closes them"""
+        expired = []
+        while self._idle:
+            conn, created_at, last_used = self._idle[0]
+            if now - last_used < self.idle_timeout and now - created_at < self.max_lifetime:
+                break
+            self._idle.popleft()
+            self._open -= 1
+            self._recycled += 1
+            expired.append(conn)
+        return expired
+
+    def acquire(self, timeout=None):
+        """Check out a validated connection, waiting up to `timeout` seconds"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        entry = None
+        expired = []
+        timed_out = False
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                expired.extend(self._reap_idle(now))
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._open < self.pool_size:
+                    self._open += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._timeouts += 1
+                    timed_out = True
+                    break
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            if not timed_out:
+                self._in_use += 1
+
+        for conn in expired:
+            self._discard(conn)
+
+        if timed_out:
+            raise PoolExhaustedError(
+                f"Connection pool exhausted: no connection available within {timeout:.1f}s "
+                f"(all {self.pool_size} connections in use)"
+            )
+
+        try:
+            conn, created_at = self._checkout(entry)
+        except Exception:
+            # The slot was reserved but no connection came of it
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            self._checkout_time_total += elapsed
+            self._checkout_time_max = max(self._checkout_time_max, elapsed)
+        return PooledConnection(self, conn, created_at)
+
+    def _checkout(self, entry):
+        """Validate an idle entry, or open a new connection when there is none"""
+        if entry is not None:
+            conn, created_at, last_used = entry
+            if time.monotonic() - last_used < self.validate_after:
+                return conn, created_at
+            try:
+                conn.ping(reconnect=False)
+                return conn, created_at
+            except Exception:
+                with self._cond:
+                    self._validation_failures += 1
+                self._discard(conn)
+        return self._connect(), time.monotonic()
+
+    def _release(self, conn, created_at):
+        """Reset a returned connection and put it back, or drop it if unhealthy"""
+        healthy = True
+        try:
+            # End any open transaction so the next borrower gets a fresh snapshot
+            conn.rollback()
+        except Exception:
+            healthy = False
+
+        now = time.monotonic()
+        if healthy and now - created_at >= self.max_lifetime:
+            healthy = False
+            with self._cond:
+                self._recycled += 1
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((conn, created_at, now))
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if not healthy:
+            self._discard(conn)
+
+    def warm(self, count=None):
+        """Open connections up front so the first requests skip the handshake"""
+        count = min(self.pool_size, count or self.pool_size)
+        conns = []
+        try:
+            for _ in range(count):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                conn.close()
+        return len(conns)
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones close on return)"""
+        with self._cond:
+            idle = [conn for conn, _, _ in self._idle]
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Snapshot of pool occupancy and checkout latency"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'pool_size': self.pool_size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'connections_created': self._created,
+                'connections_recycled': self._recycled,
+                'validation_failures': self._validation_failures,
+                'checkout_latency_avg_ms': round(self._checkout_time_total / checkouts * 1000, 3) if checkouts else 0.0,
+                'checkout_latency_max_ms': round(self._checkout_time_max * 1000, 3),
+            }
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Database Router
+Read/write split: reads to lag-checked replicas, writes (and recent writers) to the primary
+
+Replicas share the primary's credentials and are listed as host[:port]:
+
+    DB_REPLICA_HOSTS=10.0.0.12,10.0.0.13:3307
+
+To try it locally, run a second MySQL next to the first (a replica, or
+just a standalone copy loaded from schema.sql / sample_data.sql) and
+point DB_REPLICA_HOSTS at it. A server with no replication configured
+reports no lag and counts as current. Then run
+
+    python db_router.py
+
+to see each replica's health and which server a read lands on.
+"""
+
+import itertools
+import os
+import threading
+import time
+
+import mysql.connector
+
+from db_pool import ConnectionPool, PoolExhaustedError
+
+ER_PARSE_ERROR = 1064
+
+# Replicas further behind the primary than this stop receiving reads
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 5))
+# After a write, the same client reads from the primary for this long
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 10))
+
+
+def replica_configs(primary_config, hosts):
+    """Connection configs for "host[:port],..." (or a list), reusing the primary's credentials"""
+    if isinstance(hosts, str):
+        hosts = hosts.split(',')
+    configs = []
+    for host in hosts:
+        host = host.strip()
+        if not host:
+            continue
+        name, _, port = host.partition(':')
+        config = dict(primary_config, host=name)
+        if port:
+            config['port'] = int(port)
+        configs.append(config)
+    return configs
+
+
+def fetch_replica_lag(cursor):
+    """Seconds behind the source; 0 for a server with no replication, None if replication is stopped"""
+    try:
+        cursor.execute("SHOW REPLICA STATUS")
+    except mysql.connector.Error as e:
+        # Servers before 8.0.22 only know the old spelling
+        if e.errno != ER_PARSE_ERROR:
+            raise
+        cursor.execute("SHOW SLAVE STATUS")
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+    row = rows[0]
+    columns = [column[0] for column in cursor.description]
+    status = dict(zip(columns, row)) if not isinstance(row, dict) else row
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+
+class ReplicaSet:
+    """Health-checked replicas, picked round-robin among those within max_lag
+
+    Health checks use their own short-lived connection, so a busy pool
+    never reads as an unhealthy replica. They run every check_interval on
+    a background daemon thread, started by warm() or by the first choose()
+    in each process; choose() itself only reads the last known status, so
+    a slow or unreachable replica never holds up a request. Until the
+    first check completes, reads go to the primary.
+    """
+
+    def __init__(self, configs, max_lag=REPLICA_MAX_LAG, check_interval=REPLICA_CHECK_INTERVAL):
+        self.configs = list(configs)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checking = threading.Lock()
+        self._checked_at = 0.0
+        self._thread = None
+        self._stopped = threading.Event()
+        self._rotation = itertools.count()
+        self._status = [
+            {'name': f"{c['host']}:{c.get('port', 3306)}", 'healthy': False, 'lag': None, 'error': 'not checked'}
+            for c in self.configs
+        ]
+
+    def _check(self, index):
+        conn = None
+        try:
+            conn = mysql.connector.connect(connection_timeout=3, **self.configs[index])
+            cursor = conn.cursor()
+            try:
+                lag = fetch_replica_lag(cursor)
+            finally:
+                cursor.close()
+            if lag is None:
+                return {'healthy': False, 'lag': None, 'error': 'replication stopped'}
+            if lag > self.max_lag:
+                return {'healthy': False, 'lag': lag, 'error': f'lag {lag:.0f}s over {self.max_lag:.0f}s'}
+            return {'healthy': True, 'lag': lag, 'error': None}
+        except Exception as e:
+            return {'healthy': False, 'lag': None, 'error': str(e)}
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def refresh(self, force=False, wait=False):
+        """Re-check every replica if the interval has passed
+
+        With wait, a check already in progress is waited for instead of skipped.
+        """
+        if not force and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        if not self._checking.acquire(blocking=wait):
+            return
+        try:
+            if not force and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            results = [self._check(index) for index in range(len(self.configs))]
+            with self._lock:
+                for status, result in zip(self._status, results):
+                    status.update(result)
+            self._checked_at = time.monotonic()
+        finally:
+            self._checking.release()
+
+    def start(self):
+        """Run the health checks on a background thread (no-op while one is running)
+
+        Threads do not survive fork(), so a forked worker starts its own.
+        """
+        if not self.configs or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='replica-health-check', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.refresh(wait=True)
+            self._stopped.wait(max(0.0, self._checked_at + self.check_interval - time.monotonic()))
+
+    def choose(self):
+        """Index of a healthy replica, or None when reads should go to the primary"""
+        self.start()
+        with self._lock:
+            healthy = [i for i, status in enumerate(self._status) if status['healthy']]
+        if not healthy:
+            return None
+        return healthy[next(self._rotation) % len(healthy)]
+
+    def mark_failed(self, index, error):
+        """Take a replica out of rotation until its next successful check"""
+        with self._lock:
+            self._status[index].update({'healthy': False, 'error': str(error)})
+
+    def status(self):
+        with self._lock:
+            return [dict(status) for status in self._status]
+
+
+class DatabaseRouter:
+    """A pool for the primary plus one per replica, with read/write routing"""
+
+    def __init__(self, primary_config, replicas=(), max_lag=REPLICA_MAX_LAG,
+                 check_interval=REPLICA_CHECK_INTERVAL, **pool_kwargs):
+        self.primary = ConnectionPool(primary_config, **pool_kwargs)
+        self.replica_pools = [ConnectionPool(config, **pool_kwargs) for config in replicas]
+        self.replicas = ReplicaSet(replicas, max_lag, check_interval)
+
+    def acquire_write(self):
+        return self.primary.acquire()
+
+    def acquire_read(self, prefer_primary=False):
+        """Connection for a read-only query; falls back to the primary"""
+        if prefer_primary or not self.replica_pools:
+            return self.primary.acquire()
+        index = self.replicas.choose()
+        if index is None:
+            return self.primary.acquire()
+        try:
+            return self.replica_pools[index].acquire()
+        except PoolExhaustedError:
+            return self.primary.acquire()
+        except Exception as e:
+            self.replicas.mark_failed(index, e)
+            return self.primary.acquire()
+
+    def pools(self):
+        """(name, pool) for the primary and each replica"""
+        names = [status['name'] for status in self.replicas.status()]
+        return [('primary', self.primary)] + list(zip(names, self.replica_pools))
+
+    def warm(self, count=None):
+        """Check the replicas once, start their background checks and open pool connections"""
+        self.replicas.refresh(force=True)
+        self.replicas.start()
+        return sum(pool.warm(count) for _, pool in self.pools())
+
+    def close_all(self):
+        self.replicas.stop()
+        for _, pool in self.pools():
+            pool.close_all()
+
+    def replica_stats(self):
+        """Health and pool stats for each replica"""
+        return [
+            dict(status, pool=pool.stats())
+            for status, pool in zip(self.replicas.status(), self.replica_pools)
+        ]
+
+
+if __name__ == '__main__':
+    from db_config import DB_CONFIG
+
+    configs = replica_configs(DB_CONFIG, os.environ.get('DB_REPLICA_HOSTS', ''))
+    if not configs:
+        raise SystemExit("Set DB_REPLICA_HOSTS=host[:port],... to check replicas")
+
+    router = DatabaseRouter(DB_CONFIG, configs, pool_size=2)
+    router.replicas.refresh(force=True)
+    for status in router.replicas.status():
+        state = 'ok' if status['healthy'] else status['error']
+        print(f"{status['name']:<30} lag={status['lag']}  {state}")
+
+    for label, prefer_primary in (('read', False), ('read after write', True)):
+        conn = router.acquire_read(prefer_primary)
+        cursor = conn.cursor()
+        cursor.execute("SELECT @@hostname, @@port")
+        host, port = cursor.fetchone()
+        print(f"{label:<18} -> {host}:{port}")
+        cursor.close()
+        conn.close()
+    router.close_all()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Fast JSON
+Flask/Quart JSON provider with a Decimal fast path and compact row encoding
+"""
+
+import decimal
+import json
+import os
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 'orjson', 'stdlib', or 'auto' (orjson when installed)
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+
+
+def _default(obj):
+    """Encode what the serializer has no native handling for"""
+    if isinstance(obj, decimal.Decimal):
+        # DECIMAL(8,2) nutrition values go out as plain JSON numbers
+        return float(obj)
+    return DefaultJSONProvider.default(obj)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify()/json responses through orjson when available
+
+    Decimals become numbers instead of strings. Dates are ISO 8601 under
+    orjson and HTTP dates under the stdlib fallback, as Flask does.
+    """
+
+    default = staticmethod(_default)
+    compact = True
+    # Optional on_encode(seconds, size) hook timing response serialization
+    on_encode = None
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.use_orjson = orjson is not None and JSON_BACKEND in ('auto', 'orjson')
+        if JSON_BACKEND == 'orjson' and orjson is None:
+            raise RuntimeError("JSON_BACKEND=orjson but orjson is not installed (pip install orjson)")
+
+    def dumps_bytes(self, obj):
+        if self.use_orjson:
+            option = orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            return orjson.dumps(obj, default=_default, option=option)
+        return json.dumps(
+            obj, default=_default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys,
+            separators=(',', ':')
+        ).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', _default)
+            return json.dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        start = time.perf_counter()
+        body = self.dumps_bytes(obj)
+        if self.on_encode is not None:
+            self.on_encode(time.perf_counter() - start, len(body))
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def columnar(rows):
+    """Rows of dicts as {'columns': [...], 'rows': [[...], ...]} (names sent once)"""
+    if not rows:
+        return {'columns': [], 'rows': []}
+    columns = list(rows[0].keys())
+    return {'columns': columns, 'rows': [[row.get(column) for column in columns] for row in rows]}
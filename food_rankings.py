@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Food Rankings
+Top-N foods for several metrics from a single scan of the catalog
+"""
+
+# metric -> (SQL expression over nf, sort direction)
+TOP_FOOD_METRICS = {
+    'calories': ('nf.calories', 'DESC'),
+    'protein': ('nf.protein_g', 'DESC'),
+    'fiber': ('nf.fiber_g', 'DESC'),
+    'protein_efficiency': ('ROUND((nf.protein_g / NULLIF(nf.calories, 0)) * 4, 3)', 'DESC'),
+    'lowest_calorie': ('nf.calories', 'ASC'),
+}
+
+RANKED_COLUMNS = """
+    f.food_id,
+    f.name,
+    fc.name as category,
+    f.brand,
+    nf.calories,
+    nf.protein_g,
+    nf.fiber_g"""
+
+
+def parse_metrics(value):
+    """Parse "calories,protein" into a list of known metric names"""
+    metrics = [m.strip() for m in value.split(',') if m.strip()]
+    unknown = [m for m in metrics if m not in TOP_FOOD_METRICS]
+    if unknown:
+        raise ValueError(f"Invalid metric: {', '.join(unknown)}")
+    return list(dict.fromkeys(metrics))
+
+
+def build_top_foods_query(metrics, limit, category_id=None, category_name=None):
+    """SQL and params returning the top `limit` foods for every metric
+
+    A single metric uses a plain ORDER BY ... LIMIT (a top-N sort). Several
+    metrics share one scan of the join: each gets a ROW_NUMBER() window and
+    the outer query keeps rows ranked within the limit for any of them.
+    """
+    where = "WHERE 1=1"
+    params = []
+    if category_id:
+        where += " AND f.category_id = %s"
+        params.append(category_id)
+    if category_name:
+        where += " AND fc.name = %s"
+        params.append(category_name)
+
+    from_sql = f"""
+        FROM foods f
+        JOIN food_categories fc ON f.category_id = fc.category_id
+        JOIN nutrition_facts nf ON f.food_id = nf.food_id
+        {where}"""
+
+    if len(metrics) == 1:
+        expr, direction = TOP_FOOD_METRICS[metrics[0]]
+        sql = f"""
+            SELECT {RANKED_COLUMNS},
+                {expr} as value_{metrics[0]}
+            {from_sql} AND {expr} IS NOT NULL
+            ORDER BY value_{metrics[0]} {direction}
+            LIMIT %s
+        """
+        return sql, params + [limit]
+
+    value_columns = []
+    rank_columns = []
+    for metric in metrics:
+        expr, direction = TOP_FOOD_METRICS[metric]
+        value_columns.append(f"{expr} as value_{metric}")
+        # NULLs sort last in either direction so they never take a top slot
+        rank_columns.append(
+            f"ROW_NUMBER() OVER (ORDER BY {expr} IS NULL, {expr} {direction}) as rank_{metric}"
+        )
+
+    separator = ",\n                "
+    keep = " OR ".join(f"rank_{metric} <= %s" for metric in metrics)
+    sql = f"""
+        SELECT * FROM (
+            SELECT {RANKED_COLUMNS},
+                {separator.join(value_columns)},
+                {separator.join(rank_columns)}
+            {from_sql}
+        ) ranked
+        WHERE {keep}
+    """
+    return sql, params + [limit] * len(metrics)
+
+
+def split_ranked_rows(rows, metrics, limit):
+    """Group rows from build_top_foods_query into {metric: [food, ...]}
+
+    Each food dict carries the metric's figure as `value`.
+    """
+    result = {}
+    for metric in metrics:
+        value_key = f"value_{metric}"
+        ranked = [row for row in rows if row.get(value_key) is not None]
+        if len(metrics) > 1:
+            ranked = sorted(
+                (row for row in ranked if row[f"rank_{metric}"] <= limit),
+                key=lambda row: row[f"rank_{metric}"]
+            )
+        result[metric] = [
+            {
+                'food_id': row['food_id'],
+                'name': row['name'],
+                'category': row['category'],
+                'brand': row['brand'],
+                'calories': row['calories'],
+                'protein_g': row['protein_g'],
+                'fiber_g': row['fiber_g'],
+                'value': row[value_key],
+            }
+            for row in ranked[:limit]
+        ]
+    return result
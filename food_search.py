@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Food Search Helpers
+Shared FULLTEXT search clause for the dashboard, Streamlit app and analysis scripts
+"""
+
+import re
+
+# Must match the column list of the ft_search index on foods
+FULLTEXT_COLUMNS = "f.name, f.brand, f.description"
+
+# InnoDB ignores words shorter than innodb_ft_min_token_size (default 3)
+MIN_TOKEN_SIZE = 3
+
+# MATCH ... AGAINST errors a LIKE search avoids: a boolean expression the
+# parser rejects (ER_PARSE_ERROR) or no usable FULLTEXT index
+FULLTEXT_ERRNOS = (1064, 1191, 1214)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_PHRASE_RE = re.compile(r'([+-]?)"([^"]*)"')
+# + or - in front of a whole word; "low-fat" is a word, not an exclusion
+_SIGNED_WORD_RE = re.compile(r'(?<!\S)([+-])(\w+(?:-\w+)*)(\*?)(?!\S)', re.UNICODE)
+
+
+def is_boolean_query(term):
+    """True when the user typed explicit operators: +word, -word or a balanced "phrase" """
+    return bool(_PHRASE_RE.search(term) or _SIGNED_WORD_RE.search(term))
+
+
+def boolean_terms(term):
+    """Sanitized boolean-mode terms for a search, plus the words that must match
+
+    Returns (terms, required_words). Quoted phrases and +word / -word keep
+    their meaning; every other word becomes a required prefix term, as in
+    a plain search. Hyphens, brackets and stray operator characters only
+    separate words, so nothing the user types reaches the full-text parser
+    unbalanced. Words shorter than MIN_TOKEN_SIZE stay out of the terms
+    (the index never sees them) but are kept in required_words.
+    """
+    terms, required = [], []
+
+    def phrase(match):
+        sign, words = match.group(1), _TOKEN_RE.findall(match.group(2))
+        if words:
+            terms.append(f'{sign}"{" ".join(words)}"')
+            if sign != '-':
+                required.extend(words)
+        return ' '
+
+    def signed_word(match):
+        sign, text, star = match.groups()
+        words = _TOKEN_RE.findall(text)
+        if len(words) > 1:
+            terms.append(f'{sign}"{" ".join(words)}"')
+        elif len(words[0]) >= MIN_TOKEN_SIZE:
+            terms.append(f'{sign}{words[0]}{star}')
+        if sign == '+':
+            required.extend(words)
+        return ' '
+
+    rest = _SIGNED_WORD_RE.sub(signed_word, _PHRASE_RE.sub(phrase, term))
+    for word in _TOKEN_RE.findall(rest):
+        if len(word) >= MIN_TOKEN_SIZE:
+            terms.append(f'+{word}*')
+        required.append(word)
+    return terms, required
+
+
+def fulltext_expression(term):
+    """Boolean-mode AGAINST expression for a search term
+
+    Plain words become required prefix matches ("chick bre" ->
+    "+chick* +bre*"); explicit operators are kept (see boolean_terms).
+    Returns None when nothing is left for the index to match, e.g. every
+    word is too short or the term only excludes words.
+    """
+    terms, _ = boolean_terms(term.strip())
+    if not any(not t.startswith('-') for t in terms):
+        return None
+    return " ".join(terms)
+
+
+def like_filter(words):
+    """LIKE fragment and params requiring every word in the name or description"""
+    sql, params = "", []
+    for word in words:
+        sql += " AND (f.name LIKE %s OR f.description LIKE %s)"
+        params.extend([f"%{word}%", f"%{word}%"])
+    return sql, params
+
+
+def search_filter(term, fulltext=True):
+    """WHERE fragment, params and relevance expression for a search term
+
+    Returns (sql, params, score_sql, score_params). `sql` is an
+    " AND ..." fragment over the `f` (foods) alias. `score_sql` is a
+    MATCH expression to select or ORDER BY for relevance, or None when the
+    term fell back to LIKE: no word the index can use, or fulltext=False
+    (the retry after a statement failed with one of FULLTEXT_ERRNOS).
+    """
+    term = term.strip()
+    if not term:
+        return "", [], None, []
+
+    _, required = boolean_terms(term)
+    expression = fulltext_expression(term) if fulltext else None
+    if expression is None:
+        sql, params = like_filter(required or [term])
+        return sql, params, None, []
+
+    match_sql = f"MATCH({FULLTEXT_COLUMNS}) AGAINST (%s IN BOOLEAN MODE)"
+    # Words the index cannot see still have to narrow the full-text hits
+    sql, params = like_filter([word for word in required if len(word) < MIN_TOKEN_SIZE])
+    return f" AND {match_sql}" + sql, [expression] + params, match_sql, [expression]
+
+
+def is_fulltext_error(error):
+    """True for a database error that retrying with fulltext=False avoids"""
+    errno = getattr(error, 'errno', None)
+    if errno is None and getattr(error, 'args', None):
+        errno = error.args[0]
+    return errno in FULLTEXT_ERRNOS
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Food Similarity
+Nearest neighbours on normalized nutrient vectors, for "foods like this one"
+"""
+
+import os
+import warnings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from data_version import VersionedIndexStore
+
+SIMILARITY_ENABLED = np is not None
+# Catalogs at least this large answer unconstrained queries from a clustered
+# (approximate) index instead of scanning every vector
+APPROX_MIN_ROWS = int(os.environ.get('SIMILARITY_APPROX_MIN_ROWS', 50000))
+# Clusters scanned per approximate query; more is slower and closer to exact
+APPROX_PROBES = int(os.environ.get('SIMILARITY_PROBES', 8))
+
+FEATURE_COLUMNS = [
+    'calories', 'protein_g', 'carbohydrates_g', 'fat_g', 'fiber_g', 'sugar_g', 'sodium_mg',
+    'saturated_fat_g', 'cholesterol_mg', 'potassium_mg', 'calcium_mg', 'iron_mg',
+    'magnesium_mg', 'zinc_mg', 'vitamin_c_mg', 'vitamin_a_iu'
+]
+
+# Nutrient values returned alongside each neighbour
+RESULT_COLUMNS = ['calories', 'protein_g', 'carbohydrates_g', 'fat_g', 'fiber_g', 'sugar_g', 'sodium_mg']
+
+SIMILARITY_SQL = """
+    SELECT
+        f.food_id,
+        f.category_id,
+        f.name,
+        fc.name as category,
+        {columns}
+    FROM foods f
+    JOIN food_categories fc ON f.category_id = fc.category_id
+    JOIN nutrition_facts nf ON f.food_id = nf.food_id
+""".format(columns=',\n        '.join(f'nf.{column}' for column in FEATURE_COLUMNS))
+
+
+def normalize_features(raw):
+    """Standardized feature matrix from raw nutrient values (NaN for NULL)
+
+    Values are log-scaled first, since sodium, vitamin A and the like span
+    orders of magnitude; a missing value takes its column's median so it
+    neither attracts nor repels neighbours.
+    """
+    if not len(raw):
+        return np.zeros(raw.shape, dtype=np.float32)
+    scaled = np.log1p(np.clip(raw, 0, None))
+    with warnings.catch_warnings():
+        # A column with no values at all has no median; it becomes 0 below
+        warnings.simplefilter('ignore', RuntimeWarning)
+        medians = np.nanmedian(scaled, axis=0)
+    medians = np.where(np.isnan(medians), 0.0, medians)
+    scaled = np.where(np.isnan(scaled), medians, scaled)
+    std = scaled.std(axis=0)
+    std[std == 0] = 1.0
+    return ((scaled - scaled.mean(axis=0)) / std).astype(np.float32)
+
+
+def _nearest_centroids(vectors, centroids, chunk=65536):
+    """Index of the closest centroid for each vector"""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        block = vectors[start:start + chunk]
+        assignments[start:start + chunk] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return assignments
+
+
+class ClusterIndex:
+    """Inverted file over k-means clusters: a query scans only its nearest clusters"""
+
+    def __init__(self, vectors, clusters=None, iterations=8, seed=0):
+        n = len(vectors)
+        clusters = clusters or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, min(n, clusters * 40), replace=False)]
+        centroids = sample[rng.choice(len(sample), clusters, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = _nearest_centroids(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=clusters)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        assignments = _nearest_centroids(vectors, centroids)
+        self.centroids = centroids
+        self._order = np.argsort(assignments, kind='stable')
+        self._bounds = np.searchsorted(assignments[self._order], np.arange(clusters + 1))
+
+    def candidates(self, query, probes=APPROX_PROBES):
+        """Positions of the vectors in the `probes` clusters closest to query"""
+        distances = ((self.centroids - query) ** 2).sum(axis=1)
+        nearest = np.argsort(distances)[:probes]
+        return np.concatenate([self._order[self._bounds[c]:self._bounds[c + 1]] for c in nearest])
+
+
+class SimilarityIndex:
+    """Nutrient vectors of every food with nutrition facts, at one data version"""
+
+    def __init__(self, rows, version=None, approx_min_rows=APPROX_MIN_ROWS):
+        self.version = version
+        self.size = len(rows)
+        columns = list(zip(*rows)) if rows else [()] * (4 + len(FEATURE_COLUMNS))
+        self.food_id = np.array(columns[0], dtype=np.int64)
+        self.category_id = np.array(columns[1], dtype=np.int64)
+        self.name = np.array(columns[2], dtype=object)
+        self.category = np.array(columns[3], dtype=object)
+        self.raw = np.array(
+            [[np.nan if v is None else float(v) for v in values] for values in columns[4:]],
+            dtype=np.float64
+        ).T.reshape(self.size, len(FEATURE_COLUMNS))
+        self.vectors = normalize_features(self.raw)
+        self.norms = (self.vectors ** 2).sum(axis=1)
+        self._position = {food_id: i for i, food_id in enumerate(columns[0])}
+        self.clusters = ClusterIndex(self.vectors) if self.size >= approx_min_rows else None
+
+    def similar(self, food_id, k=10, category_id=None, same_category=False, exact=False):
+        """The k foods closest to food_id's nutrient profile, nearest first
+
+        category_id (or same_category) restricts the neighbours to one
+        category; such queries, small catalogs and exact=True scan every
+        candidate, the rest use the clustered index. Raises KeyError for a
+        food without nutrition facts.
+        """
+        position = self._position[food_id]
+        query = self.vectors[position]
+        if same_category:
+            category_id = int(self.category_id[position])
+
+        if category_id:
+            candidates = np.flatnonzero(self.category_id == int(category_id))
+        elif self.clusters is not None and not exact:
+            candidates = self.clusters.candidates(query)
+            if len(candidates) <= k:
+                candidates = None
+        else:
+            candidates = None
+
+        vectors = self.vectors if candidates is None else self.vectors[candidates]
+        norms = self.norms if candidates is None else self.norms[candidates]
+        distances = norms - 2 * (vectors @ query) + self.norms[position]
+        positions = np.arange(self.size) if candidates is None else candidates
+        keep = positions != position
+        positions, distances = positions[keep], distances[keep]
+
+        if len(positions) > k:
+            top = np.argpartition(distances, k)[:k]
+            positions, distances = positions[top], distances[top]
+        order = np.argsort(distances, kind='stable')
+        return positions[order], np.sqrt(np.clip(distances[order], 0, None))
+
+    def rows(self, positions, distances):
+        """Neighbours as dicts with their headline nutrients and distance"""
+        result = []
+        indexes = [FEATURE_COLUMNS.index(column) for column in RESULT_COLUMNS]
+        for position, distance in zip(positions.tolist(), distances.tolist()):
+            row = {
+                'food_id': int(self.food_id[position]),
+                'name': self.name[position],
+                'category': self.category[position],
+                'distance': round(distance, 4),
+                'similarity': round(1.0 / (1.0 + distance), 4)
+            }
+            for column, index in zip(RESULT_COLUMNS, indexes):
+                value = self.raw[position, index]
+                row[column] = None if value != value else float(value)
+            result.append(row)
+        return result
+
+
+class SimilarityIndexStore(VersionedIndexStore):
+    """Holds the similarity index and rebuilds it when the data version moves"""
+
+    def __init__(self, tracker, approx_min_rows=APPROX_MIN_ROWS):
+        super().__init__(tracker, SIMILARITY_SQL, self._build_index)
+        self.approx_min_rows = approx_min_rows
+
+    def _build_index(self, rows, version):
+        return SimilarityIndex(rows, version, self.approx_min_rows)
+
+    def stats(self):
+        index = self._index
+        return {
+            'foods': index.size if index else 0,
+            'approximate': bool(index and index.clusters is not None),
+            'clusters': len(index.clusters.centroids) if index and index.clusters is not None else 0
+        }
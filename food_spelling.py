@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Food Spelling Suggestions
+Character-trigram index over catalog words for "did you mean" corrections
+"""
+
+from collections import Counter, defaultdict
+
+from data_version import VersionedIndexStore
+from food_suggest import normalize_name
+
+# Only words at least this long are indexed or corrected
+MIN_WORD_LENGTH = 3
+# Candidates sharing the most trigrams with the query word get an edit-distance check
+MAX_CANDIDATES = 64
+# Name words count this many times more than description words
+NAME_WEIGHT = 3
+# A known word is still corrected when a close match is this many times more frequent
+COMMON_RATIO = 20
+FETCH_CHUNK = 5000
+
+SPELLING_SQL = "SELECT name, description FROM foods"
+
+
+def trigrams(word):
+    """Padded character trigrams ("egg" -> "$$e", "$eg", "egg", "gg$")"""
+    padded = f'$${word}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (adjacent swaps count once), or limit + 1 past limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def max_edits(word):
+    return 1 if len(word) <= 4 else 2
+
+
+def catalog_words(text):
+    return [w for w in normalize_name(text).split() if len(w) >= MIN_WORD_LENGTH and w.isalpha()]
+
+
+def count_words(rows, frequencies):
+    """Add the words of (name, description) rows to a Counter"""
+    for name, description in rows:
+        for word in catalog_words(name):
+            frequencies[word] += NAME_WEIGHT
+        for word in catalog_words(description or ''):
+            frequencies[word] += 1
+    return frequencies
+
+
+class SpellingIndex:
+    """Word frequencies plus a trigram -> words index for finding near misses"""
+
+    def __init__(self, frequencies, version=None):
+        self.version = version
+        self.words = list(frequencies)
+        self.frequency = dict(frequencies)
+        self._postings = defaultdict(list)  # trigram -> word positions
+        for position, word in enumerate(self.words):
+            for gram in trigrams(word):
+                self._postings[gram].append(position)
+
+    @classmethod
+    def from_rows(cls, rows, version=None):
+        """Build from (name, description) rows"""
+        return cls(count_words(rows, Counter()), version)
+
+    @property
+    def size(self):
+        return len(self.words)
+
+    def candidates(self, word, limit=5):
+        """Catalog words within edit distance of `word`, closest then most frequent first"""
+        word = normalize_name(word)
+        if len(word) < MIN_WORD_LENGTH:
+            return []
+        shared = Counter()
+        for gram in trigrams(word):
+            shared.update(self._postings.get(gram, ()))
+
+        edits = max_edits(word)
+        scored = []
+        for position, _ in shared.most_common(MAX_CANDIDATES):
+            candidate = self.words[position]
+            if candidate == word:
+                continue
+            distance = edit_distance(word, candidate, edits)
+            if distance <= edits:
+                scored.append((distance, -self.frequency[candidate], candidate))
+        scored.sort()
+        return [candidate for _, _, candidate in scored[:limit]]
+
+    def correct(self, query):
+        """The query with unknown words replaced by their best match, or None if nothing changed"""
+        words = normalize_name(query).split()
+        corrected = []
+        for word in words:
+            if len(word) < MIN_WORD_LENGTH or not word.isalpha():
+                corrected.append(word)
+                continue
+            best = self.candidates(word, 1)
+            # A word the catalog knows stays unless it looks like a rare
+            # misspelling of a far more common one
+            own = self.frequency.get(word, 0)
+            if best and self.frequency[best[0]] >= max(1, own * COMMON_RATIO):
+                corrected.append(best[0])
+            else:
+                corrected.append(word)
+        if corrected == words:
+            return None
+        return ' '.join(corrected)
+
+
+class SpellingIndexStore(VersionedIndexStore):
+    """Rebuilds the spelling index when the catalog's data version changes
+
+    One caller rebuilds while the rest keep the previous index; names and
+    descriptions are streamed in chunks, so only the word counts are held.
+    """
+
+    def build(self, cursor, version, previous):
+        cursor.execute(SPELLING_SQL)
+        frequencies = Counter()
+        rows = cursor.fetchmany(FETCH_CHUNK)
+        while rows:
+            count_words(rows, frequencies)
+            rows = cursor.fetchmany(FETCH_CHUNK)
+        return SpellingIndex(frequencies, version)
+
+    def stats(self):
+        index = self._index
+        return {'words': index.size if index else 0}
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Food Suggestions
+In-memory prefix index over food names for type-ahead search
+"""
+
+import heapq
+import os
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from data_version import VersionedIndexStore
+
+SUGGEST_LIMIT = 10
+# Popularity comes from meal logs, favorites and recipes, none of which move
+# the catalog version; a periodic full rebuild picks their changes up
+SUGGEST_FULL_REFRESH = float(os.environ.get('SUGGEST_FULL_REFRESH', 3600))
+# Prefixes matching more keys than this are answered by walking foods in
+# rank order (and memoized) instead of ranking every match
+BROAD_PREFIX_KEYS = 2000
+# Past this many changed foods, re-sorting beats inserting one by one
+BULK_UPDATE_THRESHOLD = 1000
+
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+SUGGEST_SQL = """
+    SELECT
+        f.food_id,
+        f.name,
+        fc.name as category,
+        f.updated_at,
+        (SELECT COUNT(*) FROM meal_entries me WHERE me.food_id = f.food_id)
+          + (SELECT COUNT(*) FROM user_favorite_foods uf WHERE uf.food_id = f.food_id)
+          + (SELECT COUNT(*) FROM recipe_ingredients ri WHERE ri.food_id = f.food_id) as popularity
+    FROM foods f
+    JOIN food_categories fc ON f.category_id = fc.category_id
+"""
+
+
+def normalize_name(text):
+    """Lowercase, accents stripped, punctuation collapsed to single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def name_keys(name):
+    """Index keys for a name: the whole name and its tail from every later word
+
+    "Chicken Breast, Raw" -> "chicken breast raw", "breast raw", "raw", so
+    "bre" and "chicken bre" both find it.
+    """
+    tokens = normalize_name(name).split()
+    return list(dict.fromkeys(' '.join(tokens[i:]) for i in range(len(tokens))))
+
+
+class SuggestIndex:
+    """Sorted (key, food_id) array searched by binary search
+
+    Narrow prefixes rank the foods in their key range; broad ones (a letter
+    or two) instead walk all foods in rank order and stop at `limit`
+    matches, which takes a few thousand steps at most. Never modified once
+    built: updated() returns a new index, so readers need no locking.
+    """
+
+    def __init__(self, rows, version=None, keys=None, ranked=None, foods=None):
+        self.version = version
+        self._memo = {}
+        if foods is not None:
+            self._foods, self._keys, self._ranked = foods, keys, ranked
+            return
+        self._foods = {}  # food_id -> (name, category, rank, normalized name)
+        for row in rows:
+            self._foods[row[0]] = self._entry(row)
+        self._keys = sorted(
+            (key, food_id) for food_id, entry in self._foods.items() for key in name_keys(entry[0])
+        )
+        self._ranked = sorted(entry[2] for entry in self._foods.values())
+
+    @staticmethod
+    def _entry(row):
+        food_id, name, category, _, popularity = row[:5]
+        # Most used first, then shorter (more generic) names; food_id last
+        return name, category, (-int(popularity or 0), len(name), name.lower(), food_id), normalize_name(name)
+
+    @property
+    def size(self):
+        return len(self._foods)
+
+    def updated(self, rows, version=None):
+        """Copy of the index with `rows` (SUGGEST_SQL rows) added or replaced"""
+        if not rows:
+            return SuggestIndex(None, version, self._keys, self._ranked, self._foods)
+        foods = dict(self._foods)
+        if len(rows) > BULK_UPDATE_THRESHOLD:
+            for row in rows:
+                foods[row[0]] = self._entry(row)
+            keys = sorted((key, food_id) for food_id, entry in foods.items() for key in name_keys(entry[0]))
+            ranked = sorted(entry[2] for entry in foods.values())
+            return SuggestIndex(None, version, keys, ranked, foods)
+
+        keys, ranked = list(self._keys), list(self._ranked)
+        for row in rows:
+            food_id = row[0]
+            old = foods.get(food_id)
+            if old is not None:
+                for key in name_keys(old[0]):
+                    _remove(keys, (key, food_id))
+                _remove(ranked, old[2])
+            entry = foods[food_id] = self._entry(row)
+            for key in name_keys(entry[0]):
+                insort(keys, (key, food_id))
+            insort(ranked, entry[2])
+        return SuggestIndex(None, version, keys, ranked, foods)
+
+    def _matches(self, food_id, prefix):
+        normalized = self._foods[food_id][3]
+        return normalized.startswith(prefix) or (' ' + prefix) in normalized
+
+    def suggest(self, query, limit=SUGGEST_LIMIT):
+        """Foods with a name (or a word of it onward) starting with `query`, best first"""
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+        memo_key = (prefix, limit)
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+
+        lo = bisect_left(self._keys, (prefix,))
+        hi = bisect_left(self._keys, (prefix + '\uffff',), lo)
+        if hi - lo > BROAD_PREFIX_KEYS:
+            best = []
+            for rank in self._ranked:
+                if self._matches(rank[-1], prefix):
+                    best.append(rank[-1])
+                    if len(best) == limit:
+                        break
+            if len(self._memo) < 4096:
+                self._memo[memo_key] = best
+        else:
+            food_ids = {food_id for _, food_id in self._keys[lo:hi]}
+            best = heapq.nsmallest(limit, food_ids, key=lambda food_id: self._foods[food_id][2])
+        return [
+            {'food_id': food_id, 'name': self._foods[food_id][0], 'category': self._foods[food_id][1]}
+            for food_id in best
+        ]
+
+
+def _remove(items, value):
+    i = bisect_left(items, value)
+    if i < len(items) and items[i] == value:
+        del items[i]
+
+
+class SuggestIndexStore(VersionedIndexStore):
+    """Keeps the suggestion index current with the catalog
+
+    A data version change fetches only foods updated since the last load;
+    a row count that no longer matches (deletes) or SUGGEST_FULL_REFRESH
+    elapsing triggers a full rebuild. As with the catalog snapshot, one
+    caller refreshes while the rest keep using the previous index.
+    """
+
+    def __init__(self, tracker, full_refresh=SUGGEST_FULL_REFRESH):
+        super().__init__(tracker)
+        self.full_refresh = full_refresh
+        self._loaded_through = None  # newest updated_at seen
+        self._built_at = 0.0
+        self._full_builds = 0
+        self._incremental_updates = 0
+
+    def _full_due(self):
+        return time.monotonic() - self._built_at >= self.full_refresh
+
+    def is_current(self, index, version):
+        return super().is_current(index, version) and not self._full_due()
+
+    def build(self, cursor, version, previous):
+        if previous is None or self._full_due() or self._loaded_through is None:
+            return self._build(cursor, version)
+        cursor.execute(SUGGEST_SQL + " WHERE f.updated_at >= %s", (self._loaded_through,))
+        rows = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*) FROM foods")
+        total = cursor.fetchone()[0]
+        updated = previous.updated(rows, version)
+        if updated.size != total:
+            return self._build(cursor, version)
+        self._advance(rows)
+        self._incremental_updates += 1
+        return updated
+
+    def _build(self, cursor, version):
+        cursor.execute(SUGGEST_SQL)
+        rows = cursor.fetchall()
+        self._loaded_through = None
+        self._advance(rows)
+        self._built_at = time.monotonic()
+        self._full_builds += 1
+        return SuggestIndex(rows, version)
+
+    def _advance(self, rows):
+        stamps = [row[3] for row in rows if row[3] is not None]
+        if stamps:
+            newest = max(stamps)
+            if self._loaded_through is None or newest > self._loaded_through:
+                self._loaded_through = newest
+
+    def stats(self):
+        index = self._index
+        return {
+            'foods': index.size if index else 0,
+            'full_builds': self._full_builds,
+            'incremental_updates': self._incremental_updates
+        }
@@ -11,6 +11,8 @@ import time
 from typing import List, Dict, Optional
 import sys
 
+from data_version import ensure_version_table, bump_data_version
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -284,6 +286,7 @@ def import_foods_by_category(search_terms: List[str], max_per_category: int = 10
     
     conn = get_db_connection()
     cursor = conn.cursor()
+    ensure_version_table(cursor)
     
     total_imported = 0
     
@@ -337,6 +340,10 @@ def import_foods_by_category(search_terms: List[str], max_per_category: int = 10
                 print(f"   ⚠️ Final commit failed: {e}")
             print(f"   ✅ Imported {imported_count} foods")
         
+        # Let the dashboards drop their cached catalog data
+        bump_data_version(cursor)
+        conn.commit()
+        
         print(f"\n✅ SUCCESS! Imported {total_imported} foods total")
         
     except Exception as e:
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Metrics
+In-process counters, gauges and histograms rendered in Prometheus text format
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; covers cache hits through slow remote queries and big exports
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for one metric family; samples are keyed by a tuple of label values"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._sample_lines(labels, value))
+        return lines
+
+    def _sample_lines(self, labels, value):
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, labels=(), value=0):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labels=(), value=0.0):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # per-bucket counts, +Inf count, sum
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def _sample_lines(self, labels, entry):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), entry[:-1]):
+            cumulative += count
+            le = _format_labels(self.labelnames, labels, [('le', _format_value(float(bound)))])
+            lines.append(f'{self.name}_bucket{le} {cumulative}')
+        label_str = _format_labels(self.labelnames, labels)
+        lines.append(f'{self.name}_sum{label_str} {_format_value(entry[-1])}')
+        lines.append(f'{self.name}_count{label_str} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metric families plus callbacks for values read at scrape time"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, callback):
+        """Register callback() -> [(name, kind, documentation, {labels: value})]"""
+        self._collectors.append(callback)
+        return callback
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for callback in self._collectors:
+            for name, kind, documentation, samples in callback():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples.items():
+                    lines.append(f'{name}{_format_labels([k for k, _ in labels], [v for _, v in labels])} '
+                                 f'{_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class QueryMetrics:
+    """Latency, row and error counts per named database query"""
+
+    def __init__(self, registry):
+        self.duration = registry.histogram(
+            'db_query_duration_seconds', 'Database time per named query (execute plus fetch)', ('query',)
+        )
+        self.rows = registry.counter('db_query_rows_total', 'Rows fetched per named query', ('query',))
+        self.errors = registry.counter('db_query_errors_total', 'Failed statements per named query', ('query',))
+
+    def record(self, name, seconds, rows, failed=False, operation=None, params=None, conn=None):
+        labels = (name,)
+        self.duration.observe(labels, seconds)
+        if rows:
+            self.rows.inc(labels, rows)
+        if failed:
+            self.errors.inc(labels)
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times each statement under a query name
+
+    A statement's time runs from execute() through its fetches and is
+    recorded when the next statement starts or the cursor closes, so
+    streamed (fetchmany) results are measured end to end. `record` is
+    called as record(name, seconds, rows, failed, operation, params, conn).
+    """
+
+    def __init__(self, cursor, name, record, conn=None):
+        self._cursor = cursor
+        self._name = name
+        self._record = record
+        self._conn = conn
+        self._elapsed = None
+        self._rows = 0
+        self._operation = None
+        self._params = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _finish(self, failed=False):
+        if self._elapsed is not None:
+            elapsed, self._elapsed = self._elapsed, None
+            self._record(self._name, elapsed, self._rows, failed, self._operation, self._params, self._conn)
+            self._rows = 0
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            result = method(*args)
+        except Exception:
+            if self._elapsed is not None:
+                self._elapsed += time.perf_counter() - start
+            self._finish(failed=True)
+            raise
+        if self._elapsed is not None:
+            self._elapsed += time.perf_counter() - start
+        return result
+
+    def execute(self, operation, params=None):
+        self._finish()
+        self._elapsed = 0.0
+        self._operation, self._params = operation, params
+        return self._timed(self._cursor.execute, operation, params)
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._timed(self._cursor.fetchmany, size)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def close(self):
+        # Record after closing so the connection is free for follow-up statements
+        try:
+            return self._cursor.close()
+        finally:
+            self._finish()
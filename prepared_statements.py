@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Prepared Statements
+Per-connection LRU of server-side prepared statements, keyed by statement shape
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import mysql.connector
+
+ER_UNKNOWN_STMT_HANDLER = 1243
+
+# Set DB_PREPARED_STATEMENTS=0 to send every query as plain text
+PREPARED_ENABLED = os.environ.get('DB_PREPARED_STATEMENTS', '1') not in ('0', 'false', 'no')
+# Statements kept prepared per connection; the server caps the total across
+# all connections at max_prepared_stmt_count (16382 by default)
+STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 32))
+
+
+def _text(value):
+    # Older connector releases hand back text columns from the binary
+    # protocol as bytearray
+    return value.decode('utf-8') if isinstance(value, (bytes, bytearray)) else value
+
+
+def _close(cursor):
+    try:
+        cursor.close()
+    except Exception:
+        pass
+
+
+class PreparedCursor:
+    """Cursor that executes through its connection's cached prepared statements
+
+    Parameters are bound in the binary protocol instead of being quoted into
+    the SQL. Like any unbuffered cursor, read a statement's rows (or close
+    the cursor) before running anything else on the connection; a statement
+    abandoned mid-result is closed rather than returned to the cache.
+    """
+
+    def __init__(self, cache, conn, dictionary=False):
+        self._cache = cache
+        self._conn = conn
+        self._dictionary = dictionary
+        self._sql = None
+        self._cursor = None
+        self._columns = ()
+        self._exhausted = True
+        self._ahead = None  # row read past by fetchone to detect the end
+
+    def __getattr__(self, name):
+        if self._cursor is None:
+            raise AttributeError(name)
+        return getattr(self._cursor, name)
+
+    def _release(self):
+        if self._cursor is not None:
+            cursor, self._cursor = self._cursor, None
+            self._cache.checkin(self._conn, self._sql, cursor, reusable=self._exhausted)
+
+    def _shape(self, row):
+        if self._dictionary:
+            return {name: _text(value) for name, value in zip(self._columns, row)}
+        return tuple(_text(value) for value in row)
+
+    def execute(self, operation, params=None):
+        self._release()
+        self._exhausted = False
+        self._ahead = None
+        self._sql, self._cursor = self._cache.checkout(self._conn, operation)
+        try:
+            self._cursor.execute(self._sql, tuple(params or ()))
+        except mysql.connector.Error as e:
+            self._exhausted = False
+            self._release()
+            if e.errno != ER_UNKNOWN_STMT_HANDLER:
+                raise
+            # The server dropped the statement (e.g. after a reconnect)
+            self._sql, self._cursor = self._cache.checkout(self._conn, operation, reprepare=True)
+            self._cursor.execute(self._sql, tuple(params or ()))
+        self._exhausted = self._cursor.description is None
+        self._columns = () if self._exhausted else tuple(self._cursor.column_names)
+
+    def fetchone(self):
+        """Next row, reading one ahead so a single-row result ends up fully read"""
+        if self._exhausted:
+            return None
+        row, self._ahead = self._ahead, None
+        if row is None:
+            row = self._cursor.fetchone()
+        if row is not None:
+            self._ahead = self._cursor.fetchone()
+        if self._ahead is None:
+            self._exhausted = True
+        return None if row is None else self._shape(row)
+
+    def fetchmany(self, size=1):
+        rows = [self._ahead] if self._ahead is not None else []
+        self._ahead = None
+        if not self._exhausted and size > len(rows):
+            rows += self._cursor.fetchmany(size - len(rows))
+            if len(rows) < size:
+                self._exhausted = True
+        return [self._shape(row) for row in rows]
+
+    def fetchall(self):
+        rows = [self._ahead] if self._ahead is not None else []
+        if not self._exhausted:
+            rows += self._cursor.fetchall()
+        self._ahead = None
+        self._exhausted = True
+        return [self._shape(row) for row in rows]
+
+    def close(self):
+        self._release()
+
+
+class StatementCache:
+    """Prepared statements per pooled connection, least recently used evicted first
+
+    Statements are keyed by their SQL text. The query builders bind every
+    value (LIMIT and OFFSET included) and add filter fragments in a fixed
+    order, so the text is the filter shape: each combination of present
+    and absent filters is prepared once per connection and then re-executed.
+    The entries live on the driver connection and go away with it.
+    """
+
+    def __init__(self, capacity=STATEMENT_CACHE_SIZE, enabled=PREPARED_ENABLED):
+        self.capacity = capacity
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._reprepares = 0
+
+    def cursor(self, conn, dictionary=False, **kwargs):
+        """Prepared cursor on `conn`, or a plain one when prepared statements are off"""
+        if not self.enabled:
+            return conn.cursor(dictionary=dictionary, **kwargs)
+        return PreparedCursor(self, conn, dictionary)
+
+    def _statements(self, conn):
+        raw = getattr(conn, 'driver_connection', conn)
+        statements = getattr(raw, '_prepared_statements', None)
+        if statements is None:
+            statements = raw._prepared_statements = OrderedDict()
+        return statements
+
+    def checkout(self, conn, sql, reprepare=False):
+        """(sql, prepared cursor) for a statement, preparing it on first use
+
+        The cursor is taken out of the cache while in use, so a second
+        cursor running the same statement gets its own.
+        """
+        entry = None if reprepare else self._statements(conn).pop(sql, None)
+        with self._lock:
+            if entry is not None:
+                self._hits += 1
+            elif reprepare:
+                self._reprepares += 1
+            else:
+                self._misses += 1
+        if entry is not None:
+            return entry
+        # The cached text object is what gets executed from now on; the
+        # driver skips re-preparing when it sees the same statement again
+        return sql, conn.cursor(prepared=True)
+
+    def checkin(self, conn, sql, cursor, reusable=True):
+        """Return a cursor after use; evicts the least recently used past capacity"""
+        if not reusable:
+            _close(cursor)
+            return
+        statements = self._statements(conn)
+        if sql in statements:
+            _close(cursor)
+            statements.move_to_end(sql)
+            return
+        statements[sql] = (sql, cursor)
+        evicted = []
+        while len(statements) > self.capacity:
+            evicted.append(statements.popitem(last=False)[1][1])
+        for old in evicted:
+            _close(old)
+        if evicted:
+            with self._lock:
+                self._evictions += len(evicted)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'capacity_per_connection': self.capacity,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'reprepares': self._reprepares,
+                'hit_ratio': round(self._hits / lookups, 3) if lookups else 0.0
+            }
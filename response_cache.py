@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Response Cache
+Serialized API responses with strong ETags, dropped when the data version moves
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class VersionedCache:
+    """Bounded LRU keyed by parameters, emptied when the data version moves
+
+    Entries older than ttl seconds (when set) count as misses. Cached
+    values are shared between callers, so they must be treated as
+    read-only.
+    """
+
+    def __init__(self, max_entries=512, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._version = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def lookup(self, key, version):
+        """Return the cached value for key, or None on a miss
+
+        A version different from the one the entries were built under
+        empties the cache first.
+        """
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] >= self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def store(self, key, version, value):
+        """Cache a value built under version (ignored if the version has moved on)"""
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class ResponseCache(VersionedCache):
+    """Bounded LRU of response bodies keyed by route and parameters
+
+    lookup() returns (body, etag, mimetype).
+    """
+
+    def store(self, key, version, body, mimetype):
+        """Cache a response body and return its strong ETag"""
+        etag = hashlib.sha1(body).hexdigest()
+        super().store(key, version, (body, etag, mimetype))
+        return etag
@@ -2,12 +2,28 @@
 """
 Start the Nutrition Database Web Server
 Access at: http://localhost:5000
+
+Usage:
+    python run_server.py                  # development server
+    python run_server.py --prod           # pre-forked production server
+    python run_server.py --prod -w 8 -t 4 # 8 workers x 4 threads
+
+Production settings can also come from the environment:
+WEB_WORKERS, WEB_THREADS, WEB_TIMEOUT, WEB_KEEPALIVE, WEB_BIND.
+
+The app is preloaded in the gunicorn master, so SIGHUP only restarts the
+workers gracefully on the code already loaded. To deploy new code,
+restart the server, or send USR2 to start a new master on the new code
+and then QUIT to the old one once its workers are up.
 """
 
-from app import app
+import argparse
+import multiprocessing
+import os
 
-if __name__ == '__main__':
-    print("""
+from app import app, warm_up
+
+BANNER = """
     ╔════════════════════════════════════════════════════════════════╗
     ║   🥗 NUTRITION DATABASE WEB DASHBOARD                         ║
     ║                                                                ║
@@ -24,6 +40,84 @@ if __name__ == '__main__':
     ║                                                                ║
     ║   Press Ctrl+C to stop the server                            ║
     ╚════════════════════════════════════════════════════════════════╝
-    """)
-    
-    app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
+    """
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Nutrition Database web server")
+    parser.add_argument('--prod', action='store_true',
+                        help="run the multi-worker production server")
+    parser.add_argument('-b', '--bind',
+                        help="address to listen on with --prod (default 0.0.0.0:5000)")
+    parser.add_argument('-w', '--workers', type=int,
+                        default=int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count())),
+                        help="worker processes (default: one per CPU core)")
+    parser.add_argument('-t', '--threads', type=int, default=int(os.environ.get('WEB_THREADS', 4)),
+                        help="threads per worker (default 4)")
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('WEB_TIMEOUT', 60)),
+                        help="seconds before a stuck request's worker is restarted (default 60)")
+    parser.add_argument('--keepalive', type=int, default=int(os.environ.get('WEB_KEEPALIVE', 5)),
+                        help="seconds to hold idle keep-alive connections (default 5)")
+    parser.add_argument('--max-requests', type=int, default=int(os.environ.get('WEB_MAX_REQUESTS', 0)),
+                        help="recycle a worker after this many requests (0 = never)")
+    args = parser.parse_args()
+    if not args.prod:
+        if args.bind:
+            parser.error("--bind only applies with --prod; the development server listens on 0.0.0.0:5000")
+        if os.environ.get('WEB_BIND'):
+            print("Warning: WEB_BIND is ignored by the development server (0.0.0.0:5000)")
+    args.bind = args.bind or os.environ.get('WEB_BIND', '0.0.0.0:5000')
+    return args
+
+
+def run_production(args):
+    """Serve with gunicorn: pre-forked workers, each warmed before it takes traffic"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("Production mode needs gunicorn: pip install gunicorn (Linux/macOS only)")
+
+    def post_worker_init(worker):
+        try:
+            warm_up(args.threads)
+            worker.log.info("Worker %s warmed connection pool and caches", worker.pid)
+        except Exception as e:
+            worker.log.warning("Worker %s warm-up failed: %s", worker.pid, e)
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'graceful_timeout': args.timeout,
+        'keepalive': args.keepalive,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        # Workers fork from an already-imported app (shared memory, import
+        # errors fail at startup); see the module docstring for deploys
+        'preload_app': True,
+        'post_worker_init': post_worker_init,
+        'accesslog': '-',
+    }
+
+    class DashboardServer(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    DashboardServer().run()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    print(BANNER)
+
+    if args.prod:
+        print(f"    Production mode: {args.workers} workers x {args.threads} threads on {args.bind}\n")
+        run_production(args)
+    else:
+        app.run(debug=False, host='0.0.0.0', port=5000)
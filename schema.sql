@@ -99,6 +99,14 @@ CREATE TABLE nutrition_facts (
     FOREIGN KEY (food_id) REFERENCES foods(food_id) ON DELETE CASCADE
 );
 
+-- Bumped by import_usda_foods.py / clear_foods.py so dashboard caches can
+-- tell when the catalog changed
+CREATE TABLE catalog_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
 -- ============================================================================
 -- RECIPES AND MEAL COMPOSITION
 -- ============================================================================
@@ -321,6 +329,8 @@ CREATE TABLE audit_logs (
 -- ============================================================================
 
 CREATE INDEX idx_nutrition_facts_calories ON nutrition_facts(calories);
+CREATE INDEX idx_foods_updated ON foods(updated_at);
+CREATE INDEX idx_nutrition_facts_updated ON nutrition_facts(updated_at);
 CREATE INDEX idx_meals_user_date ON meals(user_id, meal_date);
 CREATE INDEX idx_meal_entries_meal ON meal_entries(meal_id);
 CREATE INDEX idx_weight_logs_user_date ON weight_logs(user_id, log_date);
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Slow Query Log
+Captures statements over a latency threshold, grouped by normalized shape, with EXPLAIN plans
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 250))
+SLOW_QUERY_BUFFER = int(os.environ.get('SLOW_QUERY_BUFFER', 200))
+# Append each captured statement (and new plans) as JSON lines to this file
+SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE')
+# Snapshots written by dump(); defaults to slow_query_dumps/ next to the log
+# file, or in the working directory when there is none
+SLOW_QUERY_DUMP_DIR = os.environ.get('SLOW_QUERY_DUMP_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(SLOW_QUERY_LOG_FILE)) if SLOW_QUERY_LOG_FILE else os.getcwd(),
+    'slow_query_dumps'
+)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+def normalize_sql(sql):
+    """Statement shape: literals and placeholders become ?, IN lists collapse to (?+)"""
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    return _PLACEHOLDER_LIST.sub('(?+)', sql)
+
+
+def shape_id(shape):
+    return hashlib.sha1(shape.encode('utf-8')).hexdigest()[:12]
+
+
+def plan_warnings(plan):
+    """Full scans, filesorts and temporary tables found anywhere in an EXPLAIN FORMAT=JSON plan"""
+    warnings = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('access_type') == 'ALL':
+                warnings.append(f"full scan of {node.get('table_name', '?')}")
+            if node.get('using_filesort'):
+                warnings.append('filesort')
+            if node.get('using_temporary_table'):
+                warnings.append('temporary table')
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return list(dict.fromkeys(warnings))
+
+
+def explain(conn, sql, params):
+    """EXPLAIN FORMAT=JSON for a SELECT, parsed"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("EXPLAIN FORMAT=JSON " + sql, params)
+        row = cursor.fetchone()
+        return json.loads(row[0])
+    finally:
+        cursor.close()
+
+
+class SlowQueryLog:
+    """Ring buffer of slow statements plus one EXPLAIN plan per statement shape
+
+    Use record() as an InstrumentedCursor recorder. The plan is captured
+    the first time a shape is slow, on the connection that ran it.
+    """
+
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, capacity=SLOW_QUERY_BUFFER,
+                 max_plans=100, log_file=SLOW_QUERY_LOG_FILE, dump_dir=SLOW_QUERY_DUMP_DIR):
+        self.threshold = threshold_ms / 1000.0
+        self.max_plans = max_plans
+        self.log_file = log_file
+        self.dump_dir = dump_dir
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=capacity)
+        self._plans = OrderedDict()  # shape id -> plan record
+        self._explaining = set()
+
+    def record(self, name, seconds, rows, failed=False, operation=None, params=None, conn=None):
+        if seconds < self.threshold or not operation:
+            return
+
+        shape = normalize_sql(operation)
+        sid = shape_id(shape)
+        entry = {
+            'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'query': name,
+            'shape_id': sid,
+            'duration_ms': round(seconds * 1000, 1),
+            'rows': rows,
+            'failed': failed,
+            'params': [repr(p)[:200] for p in (params or [])[:50]]
+        }
+
+        with self._lock:
+            self._entries.append(entry)
+            needs_plan = sid not in self._plans and sid not in self._explaining
+            if needs_plan:
+                self._explaining.add(sid)
+
+        plan = None
+        if needs_plan:
+            plan = self._capture_plan(sid, shape, operation, params, conn, failed)
+        self._write_log(entry, plan)
+
+    def _capture_plan(self, sid, shape, operation, params, conn, failed):
+        plan = {'shape_id': sid, 'shape': shape, 'plan': None, 'warnings': [], 'error': None}
+        try:
+            if conn is None or failed or not shape.lower().startswith(('select', 'with')):
+                plan['error'] = 'not explainable'
+            else:
+                plan['plan'] = explain(conn, operation, params)
+                plan['warnings'] = plan_warnings(plan['plan'])
+        except Exception as e:
+            plan['error'] = str(e)
+
+        with self._lock:
+            self._explaining.discard(sid)
+            # A failed EXPLAIN (e.g. connection busy) is retried next time
+            if plan['error'] is None or plan['error'] == 'not explainable':
+                self._plans[sid] = plan
+                while len(self._plans) > self.max_plans:
+                    self._plans.popitem(last=False)
+        return plan
+
+    def _write_log(self, entry, plan):
+        if not self.log_file:
+            return
+        try:
+            with self._lock, open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'slow_query': entry}) + '\n')
+                if plan is not None:
+                    f.write(json.dumps({'plan': plan}, default=str) + '\n')
+        except OSError:
+            pass
+
+    def snapshot(self):
+        """Captured statements (newest first) and plans, summarized per shape"""
+        with self._lock:
+            entries = list(self._entries)[::-1]
+            plans = list(self._plans.values())
+        shapes = {}
+        for entry in entries:
+            summary = shapes.setdefault(entry['shape_id'], {'count': 0, 'max_ms': 0.0, 'total_ms': 0.0})
+            summary['count'] += 1
+            summary['max_ms'] = max(summary['max_ms'], entry['duration_ms'])
+            summary['total_ms'] = round(summary['total_ms'] + entry['duration_ms'], 1)
+        return {
+            'threshold_ms': self.threshold * 1000,
+            'shapes': shapes,
+            'plans': plans,
+            'entries': entries
+        }
+
+    def dump(self):
+        """Write the current snapshot as JSON to a new timestamped file in dump_dir; returns its path
+
+        Files are only ever created, never overwritten.
+        """
+        os.makedirs(self.dump_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        snapshot = self.snapshot()
+        for attempt in range(100):
+            suffix = f'-{attempt}' if attempt else ''
+            path = os.path.join(self.dump_dir, f'slow-queries-{stamp}-{os.getpid()}{suffix}.json')
+            try:
+                with open(path, 'x', encoding='utf-8') as f:
+                    json.dump(snapshot, f, indent=2, default=str)
+                return path
+            except FileExistsError:
+                continue
+        raise FileExistsError(f"No free dump file name for {stamp} in {self.dump_dir}")
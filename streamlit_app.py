@@ -8,12 +8,32 @@ import streamlit as st
 import pandas as pd
 import mysql.connector
 from datetime import datetime, timedelta
-import plotly.graph_objects as go
-import plotly.express as px
+import time
 from io import StringIO
 import csv
+import functools
+import contextlib
 import json
 import hashlib
+import os
+
+from food_rankings import TOP_FOOD_METRICS, build_top_foods_query, split_ranked_rows
+from data_version import DataVersionTracker
+from catalog_snapshot import SNAPSHOT_ENABLED, CatalogSnapshotStore
+from metrics import InstrumentedCursor
+from slow_queries import SlowQueryLog
+from prepared_statements import StatementCache
+from response_cache import VersionedCache
+from food_search import is_fulltext_error
+from catalog_queries import SEARCH_RANGE_COLUMNS, build_best_match_queries, build_search_query
+from food_suggest import SUGGEST_LIMIT, SuggestIndexStore
+from food_spelling import SpellingIndexStore
+from food_similarity import SIMILARITY_ENABLED, SimilarityIndexStore
+from db_pool import PoolExhaustedError
+from db_router import DatabaseRouter, replica_configs, READ_YOUR_WRITES_SECONDS
+
+# Start of this script run, for per-view time-to-interactive
+run_started = time.perf_counter()
 
 # Page config
 st.set_page_config(
@@ -36,6 +56,10 @@ if 'daily_goals' not in st.session_state:
     st.session_state.daily_goals = {'calories': 2000, 'protein': 50, 'carbs': 250, 'fat': 65}
 if 'search_history' not in st.session_state:
     st.session_state.search_history = []
+# Cleared at the end of the script, so fragment-only reruns can be told apart
+st.session_state.full_run = True
+if 'lazy_views' not in st.session_state:
+    st.session_state.lazy_views = os.environ.get('STREAMLIT_LAZY_VIEWS', '1') not in ('0', 'false', 'no')
 
 # Database configuration
 def get_db_config():
@@ -56,18 +80,78 @@ def get_db_config():
         st.error(f"Error reading database configuration: {str(e)}")
         st.stop()
 
-def get_db_connection():
-    """Get fresh database connection with error handling"""
+@st.cache_resource
+def get_db_router():
+    """Connection pools for the primary and any read replicas, shared by every session
+
+    Idle connections are pinged before reuse and replaced when dead or old.
+    Replicas come from secrets (database.replicas = "host[:port],...");
+    database.pool_size caps open connections per server.
+    """
+    config = get_db_config()
+    replicas = replica_configs(config, st.secrets["database"].get("replicas", ""))
+    return DatabaseRouter(config, replicas, pool_size=int(st.secrets["database"].get("pool_size", 5)))
+
+def get_db_connection(write=False):
+    """Check out a pooled database connection; close() hands it back
+
+    Reads may be served by a replica; writes go to the primary, and so do
+    this session's reads for a short while after it writes.
+    """
     try:
-        config = get_db_config()
-        conn = mysql.connector.connect(**config)
-        if not conn.is_connected():
-            conn.reconnect()
-        return conn
-    except mysql.connector.Error as e:
+        router = get_db_router()
+        if write:
+            st.session_state.read_primary_until = time.time() + READ_YOUR_WRITES_SECONDS
+            return router.acquire_write()
+        return router.acquire_read(prefer_primary=time.time() < st.session_state.get('read_primary_until', 0))
+    except (mysql.connector.Error, PoolExhaustedError) as e:
         st.error(f"Database connection failed: {str(e)}")
         st.stop()
 
+@contextlib.contextmanager
+def lazy_connection():
+    """Yield connect(), which checks out a connection on its first call; it is closed on exit"""
+    conn = None
+    
+    def connect():
+        nonlocal conn
+        if conn is None:
+            conn = get_db_connection()
+        return conn
+    
+    try:
+        yield connect
+    finally:
+        if conn:
+            conn.close()
+
+@st.cache_resource
+def get_slow_query_log():
+    """Slow statements from this process (thresholds from SLOW_QUERY_MS / SLOW_QUERY_LOG_FILE)"""
+    return SlowQueryLog()
+
+@st.cache_resource
+def get_statement_cache():
+    """Prepared statements per connection, with process-wide hit/miss counts"""
+    return StatementCache()
+
+def record_query(name, seconds, rows, failed=False, operation=None, params=None, conn=None):
+    """Add a statement to this session's query stats and the slow query log"""
+    stats = st.session_state.setdefault('query_stats', {})
+    entry = stats.setdefault(name, {'count': 0, 'errors': 0, 'rows': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+    elapsed_ms = seconds * 1000
+    entry['count'] += 1
+    entry['errors'] += int(failed)
+    entry['rows'] += rows
+    entry['total_ms'] += elapsed_ms
+    entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+    get_slow_query_log().record(name, seconds, rows, failed, operation, params, conn)
+
+def traced_cursor(conn, name, prepared=False, **kwargs):
+    """Cursor timed into the session's query stats, with slow statements captured"""
+    cursor = get_statement_cache().cursor(conn, **kwargs) if prepared else conn.cursor(**kwargs)
+    return InstrumentedCursor(cursor, name, record_query, conn)
+
 # Database functions for persistent storage
 def save_bookmarks_to_db(user_id, bookmarks):
     """Save bookmarks to database (future enhancement)"""
@@ -91,7 +175,7 @@ def get_categories():
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = traced_cursor(conn, 'categories', dictionary=True)
         cursor.execute("""
             SELECT 
                 fc.category_id,
@@ -109,7 +193,7 @@ def get_categories():
         st.error(f"Error fetching categories: {str(e)}")
         return []
     finally:
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
 @st.cache_data(ttl=3600)
@@ -118,7 +202,7 @@ def get_stats():
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = traced_cursor(conn, 'stats', dictionary=True)
         cursor.execute("""
             SELECT 
                 (SELECT COUNT(*) FROM food_categories) as categories,
@@ -133,122 +217,224 @@ def get_stats():
         st.error(f"Error fetching database stats: {str(e)}")
         return {'categories': 0, 'foods': 0, 'nutrition_records': 0, 'last_updated': None}
     finally:
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
+@st.cache_resource
+def get_data_version_tracker():
+    """Process-wide catalog version shared by every index and result cache, polled every 30s at most"""
+    return DataVersionTracker(check_interval=30)
+
+@st.cache_resource
+def get_catalog_snapshot_store():
+    """Process-wide in-memory catalog, rebuilt when the data version changes"""
+    return CatalogSnapshotStore(get_data_version_tracker())
+
+def get_catalog_snapshot():
+    """Current catalog snapshot, or None to query MySQL instead"""
+    if not SNAPSHOT_ENABLED:
+        return None
+    with lazy_connection() as connect:
+        try:
+            return get_catalog_snapshot_store().get(connect)
+        except mysql.connector.Error:
+            return None
+
+@st.cache_resource
+def get_suggest_store():
+    """Process-wide type-ahead index, updated as the catalog changes"""
+    return SuggestIndexStore(get_data_version_tracker())
+
+def suggest_foods(prefix, limit=SUGGEST_LIMIT):
+    """Type-ahead matches for a partial food name, most used first"""
+    with lazy_connection() as connect:
+        try:
+            index = get_suggest_store().get(connect)
+            return index.suggest(prefix, limit) if index is not None else []
+        except mysql.connector.Error:
+            return []
+
+@st.cache_resource
+def get_spelling_store():
+    """Process-wide trigram index of catalog words for "did you mean" """
+    return SpellingIndexStore(get_data_version_tracker())
+
+def correct_spelling(search_term):
+    """Closest spelling of the search term the catalog knows, or None"""
+    with lazy_connection() as connect:
+        try:
+            index = get_spelling_store().get(connect)
+            return index.correct(search_term) if index is not None else None
+        except mysql.connector.Error:
+            return None
+
+@st.cache_resource
+def get_similarity_store():
+    """Process-wide nutrient vectors for nearest-neighbour lookups"""
+    return SimilarityIndexStore(get_data_version_tracker())
+
+def get_nutrient_neighbours(food_id, limit=5, same_category=False):
+    """Foods whose nutrient profile is closest to food_id's (empty without NumPy)"""
+    if not SIMILARITY_ENABLED:
+        return []
+    with lazy_connection() as connect:
+        try:
+            index = get_similarity_store().get(connect)
+            if index is None:
+                return []
+            positions, distances = index.similar(food_id, limit, same_category=same_category)
+            return index.rows(positions, distances)
+        except KeyError:
+            # No nutrition facts for this food
+            return []
+        except mysql.connector.Error as e:
+            st.error(f"Error finding similar foods: {str(e)}")
+            return []
+
+def use_suggestion(name):
+    """Put a picked suggestion into the search box"""
+    st.session_state.search_term = name
+
+SEARCH_RESULT_COLUMNS = [
+    'food_id', 'name', 'brand', 'serving_size', 'category', 'calories', 'protein_g',
+    'fat_g', 'carbohydrates_g', 'fiber_g', 'sodium_mg', 'sugar_g'
+]
+
+def search_ranges(min_cal, max_cal, min_protein, max_protein, min_fiber, max_fiber, min_sodium, max_sodium):
+    """Nutrient (min, max) bounds from the filter inputs; blank means unbounded"""
+    def bound(value):
+        return float(value) if value else None
+    
+    return {
+        'calories': (bound(min_cal), bound(max_cal)),
+        'protein_g': (bound(min_protein), bound(max_protein)),
+        'fiber_g': (bound(min_fiber), bound(max_fiber)),
+        'sodium_mg': (bound(min_sodium), bound(max_sodium))
+    }
+
+def filter_snapshot(snapshot, category_id, ranges):
+    """Filter-only search against the in-memory snapshot (same 500-row cap)"""
+    positions = snapshot.select(category_id, ranges)[:500]
+    return snapshot.rows(positions, SEARCH_RESULT_COLUMNS)
+
+@st.cache_resource
+def get_search_cache():
+    """Process-wide search results, emptied when the catalog data version changes"""
+    return VersionedCache(
+        max_entries=int(os.environ.get('SEARCH_CACHE_SIZE', 256)),
+        ttl=float(os.environ.get('SEARCH_CACHE_TTL', 300))
+    )
+
+def search_cache_key(search_term, category_id, ranges):
+    """Filters in canonical form, so equivalent searches share a cache entry"""
+    return (
+        # The search clause strips the term and MySQL's collation ignores case
+        search_term.strip().lower(),
+        str(category_id or ''),
+        tuple(ranges[column] for column in SEARCH_RANGE_COLUMNS)
+    )
+
 def search_foods(search_term='', category_id='', min_cal='', max_cal='', min_protein='', max_protein='', min_fiber='', max_fiber='', min_sodium='', max_sodium=''):
-    """Search for foods with advanced filters and error handling"""
-    conn = None
+    """Search for foods with advanced filters and error handling
+
+    Results are cached across sessions by filter values; rerunning the
+    same search (e.g. after a button click) skips the database.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        query = """
-            SELECT 
-                f.food_id,
-                f.name,
-                f.brand,
-                f.serving_size,
-                fc.name as category,
-                nf.calories,
-                nf.protein_g,
-                nf.fat_g,
-                nf.carbohydrates_g,
-                nf.fiber_g,
-                nf.sodium_mg,
-                nf.sugar_g
-            FROM foods f
-            JOIN food_categories fc ON f.category_id = fc.category_id
-            LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-            WHERE 1=1
-        """
-        
-        params = []
-        
-        if search_term:
-            query += " AND (f.name LIKE %s OR f.description LIKE %s)"
-            params.extend([f"%{search_term}%", f"%{search_term}%"])
-            # Add to search history
-            if search_term not in st.session_state.search_history:
-                st.session_state.search_history.append(search_term)
-                if len(st.session_state.search_history) > 10:
-                    st.session_state.search_history.pop(0)
-        
-        if category_id:
-            query += " AND fc.category_id = %s"
-            params.append(category_id)
-        
-        if min_cal:
-            query += " AND nf.calories >= %s"
-            params.append(float(min_cal))
-        
-        if max_cal:
-            query += " AND nf.calories <= %s"
-            params.append(float(max_cal))
-            
-        if min_protein:
-            query += " AND nf.protein_g >= %s"
-            params.append(float(min_protein))
-            
-        if max_protein:
-            query += " AND nf.protein_g <= %s"
-            params.append(float(max_protein))
-            
-        if min_fiber:
-            query += " AND nf.fiber_g >= %s"
-            params.append(float(min_fiber))
-            
-        if max_fiber:
-            query += " AND nf.fiber_g <= %s"
-            params.append(float(max_fiber))
-            
-        if min_sodium:
-            query += " AND nf.sodium_mg >= %s"
-            params.append(float(min_sodium))
-            
-        if max_sodium:
-            query += " AND nf.sodium_mg <= %s"
-            params.append(float(max_sodium))
-        
-        query += " ORDER BY f.name LIMIT 500"
-        
-        cursor.execute(query, params)
-        foods = cursor.fetchall()
-        cursor.close()
-        return foods if foods else []
-    except mysql.connector.Error as e:
-        st.error(f"Error searching foods: {str(e)}")
-        return []
+        ranges = search_ranges(min_cal, max_cal, min_protein, max_protein, min_fiber, max_fiber, min_sodium, max_sodium)
     except ValueError as e:
         st.error(f"Invalid filter value: {str(e)}")
         return []
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
+    
+    if search_term:
+        # Add to search history
+        if search_term not in st.session_state.search_history:
+            st.session_state.search_history.append(search_term)
+            if len(st.session_state.search_history) > 10:
+                st.session_state.search_history.pop(0)
+    else:
+        snapshot = get_catalog_snapshot()
+        if snapshot is not None:
+            return filter_snapshot(snapshot, category_id, ranges)
+    
+    cache, tracker = get_search_cache(), get_data_version_tracker()
+    key = search_cache_key(search_term, category_id, ranges)
+    with lazy_connection() as connect:
+        try:
+            version = tracker.current(connect)
+            foods = cache.lookup(key, version)
+            if foods is not None:
+                return list(foods)
+            
+            cursor = traced_cursor(connect(), 'search_foods', prepared=True, dictionary=True)
+            query, params = build_search_query(search_term, category_id, ranges)
+            try:
+                cursor.execute(query, params)
+            except mysql.connector.Error as e:
+                if not search_term or not is_fulltext_error(e):
+                    raise
+                # The full-text statement failed; repeat the search with LIKE
+                cursor.execute(*build_search_query(search_term, category_id, ranges, fulltext=False))
+            foods = cursor.fetchall() or []
+            cursor.close()
+            cache.store(key, version, foods)
+            return list(foods)
+        except mysql.connector.Error as e:
+            st.error(f"Error searching foods: {str(e)}")
+            return []
+
+@st.cache_resource
+def get_best_match_cache():
+    """Process-wide best matches for typed food names, emptied when the data version changes"""
+    return VersionedCache(
+        max_entries=int(os.environ.get('BEST_MATCH_CACHE_SIZE', 256)),
+        ttl=float(os.environ.get('SEARCH_CACHE_TTL', 300))
+    )
+
+def find_best_match(search_term):
+    """The one food a typed name most likely means (exact, then prefix, then full-text), or None"""
+    key = search_term.strip().lower()
+    if not key:
+        return None
+    cache, tracker = get_best_match_cache(), get_data_version_tracker()
+    with lazy_connection() as connect:
+        try:
+            version = tracker.current(connect)
+            food = cache.lookup(key, version)
+            if food is None:
+                # {} caches "no such food" too
+                food = {}
+                cursor = traced_cursor(connect(), 'best_match', prepared=True, dictionary=True)
+                try:
+                    for query, params in build_best_match_queries(search_term):
+                        try:
+                            cursor.execute(query, params)
+                        except mysql.connector.Error as e:
+                            if not is_fulltext_error(e):
+                                raise
+                            # Only the last (full-text) step can fail this way
+                            cursor.execute(*build_best_match_queries(search_term, fulltext=False)[-1])
+                        rows = cursor.fetchall()
+                        if rows:
+                            food = rows[0]
+                            break
+                finally:
+                    cursor.close()
+                cache.store(key, version, food)
+            return food or None
+        except mysql.connector.Error as e:
+            st.error(f"Error looking up food: {str(e)}")
+            return None
 
 def get_similar_foods(search_term, limit=5):
-    """Get similar foods for search suggestions"""
-    conn = None
-    try:
-        if not search_term or len(search_term) < 1:
-            return []
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT f.name FROM foods f
-            WHERE f.name LIKE %s
-            LIMIT %s
-        """, (f"%{search_term[0]}%", limit))
-        results = cursor.fetchall()
-        cursor.close()
-        return [r['name'] for r in results] if results else []
-    except mysql.connector.Error as e:
-        st.error(f"Error fetching suggestions: {str(e)}")
-        return []
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
+    """Spelling correction for a search with no results, and foods matching it
+
+    Returns (corrected term or None, food names).
+    """
+    if not search_term:
+        return None, []
+    corrected = correct_spelling(search_term)
+    return corrected, [food['name'] for food in suggest_foods(corrected or search_term, limit)]
 
 @st.cache_data(ttl=3600)
 def get_category_stats():
@@ -256,7 +442,7 @@ def get_category_stats():
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = traced_cursor(conn, 'category_stats', dictionary=True)
         cursor.execute("""
             SELECT 
                 fc.name as category,
@@ -280,93 +466,41 @@ def get_category_stats():
         st.error(f"Error fetching category stats: {str(e)}")
         return []
     finally:
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
 @st.cache_data(ttl=3600)
-def get_top_foods(metric='calories', category='', limit=10):
-    """Get top foods by metric"""
+def get_all_top_foods(category='', limit=10):
+    """Get top foods for every ranking metric from one scan"""
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = traced_cursor(conn, 'top_foods', dictionary=True)
         
-        if metric == 'calories':
-            query = """
-                SELECT f.food_id, f.name, fc.name as category, nf.calories as value, f.brand
-                FROM foods f
-                JOIN food_categories fc ON f.category_id = fc.category_id
-                LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-                WHERE nf.calories IS NOT NULL
-            """
-        elif metric == 'protein':
-            query = """
-                SELECT f.food_id, f.name, fc.name as category, nf.protein_g as value, f.brand
-                FROM foods f
-                JOIN food_categories fc ON f.category_id = fc.category_id
-                LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-                WHERE nf.protein_g IS NOT NULL
-            """
-        elif metric == 'fiber':
-            query = """
-                SELECT f.food_id, f.name, fc.name as category, nf.fiber_g as value, f.brand
-                FROM foods f
-                JOIN food_categories fc ON f.category_id = fc.category_id
-                LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-                WHERE nf.fiber_g IS NOT NULL
-            """
-        elif metric == 'protein_efficiency':
-            query = """
-                SELECT f.food_id, f.name, fc.name as category, 
-                       ROUND((nf.protein_g / nf.calories) * 4, 3) as value, f.brand
-                FROM foods f
-                JOIN food_categories fc ON f.category_id = fc.category_id
-                LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-                WHERE nf.calories IS NOT NULL AND nf.protein_g IS NOT NULL
-            """
-        elif metric == 'lowest_calorie':
-            query = """
-                SELECT f.food_id, f.name, fc.name as category, nf.calories as value, f.brand
-                FROM foods f
-                JOIN food_categories fc ON f.category_id = fc.category_id
-                LEFT JOIN nutrition_facts nf ON f.food_id = nf.food_id
-                WHERE nf.calories IS NOT NULL
-            """
-        else:
-            return []
-        
-        if category:
-            query += f" AND fc.name = %s"
-        
-        if metric == 'lowest_calorie':
-            query += " ORDER BY value ASC"
-        else:
-            query += " ORDER BY value DESC"
-        
-        query += f" LIMIT %s"
-        
-        if category:
-            cursor.execute(query, (category, limit))
-        else:
-            cursor.execute(query, (limit,))
-            
-        foods = cursor.fetchall()
+        metrics = list(TOP_FOOD_METRICS)
+        query, params = build_top_foods_query(metrics, limit, category_name=category)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
         cursor.close()
-        return foods if foods else []
+        return split_ranked_rows(rows, metrics, limit)
     except mysql.connector.Error as e:
         st.error(f"Error fetching top foods: {str(e)}")
-        return []
+        return {}
     finally:
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
+def get_top_foods(metric='calories', category='', limit=10):
+    """Get top foods by metric (switching metrics reuses the cached ranking)"""
+    return get_all_top_foods(category, limit).get(metric, [])
+
 @st.cache_data(ttl=3600)
 def get_overall_stats():
     """Get overall nutrition statistics"""
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = traced_cursor(conn, 'overall_stats', dictionary=True)
         cursor.execute("""
             SELECT 
                 ROUND(AVG(calories), 2) as avg_calories,
@@ -386,7 +520,7 @@ def get_overall_stats():
         st.error(f"Error fetching overall stats: {str(e)}")
         return {}
     finally:
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
 @st.cache_data(ttl=3600)
@@ -395,7 +529,7 @@ def get_extended_stats():
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = traced_cursor(conn, 'extended_stats', dictionary=True)
         cursor.execute("""
             SELECT 
                 COUNT(*) as total_foods,
@@ -430,7 +564,7 @@ def get_extended_stats():
         st.error(f"Error fetching extended stats: {str(e)}")
         return {}
     finally:
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
 @st.cache_data(ttl=3600)
@@ -439,7 +573,7 @@ def get_calorie_distribution():
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = traced_cursor(conn, 'calorie_distribution', dictionary=True)
         cursor.execute("""
             SELECT calories
             FROM nutrition_facts
@@ -453,7 +587,7 @@ def get_calorie_distribution():
         st.error(f"Error fetching calorie distribution: {str(e)}")
         return []
     finally:
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
 @st.cache_data(ttl=3600)
@@ -462,7 +596,7 @@ def get_nutrition_by_category_detailed():
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = traced_cursor(conn, 'nutrition_by_category', dictionary=True)
         cursor.execute("""
             SELECT 
                 fc.name as category,
@@ -490,7 +624,7 @@ def get_nutrition_by_category_detailed():
         st.error(f"Error fetching category details: {str(e)}")
         return []
     finally:
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
 def get_food_details(food_id):
@@ -498,7 +632,7 @@ def get_food_details(food_id):
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = traced_cursor(conn, 'food_details', dictionary=True)
         cursor.execute("""
             SELECT 
                 f.food_id,
@@ -525,7 +659,7 @@ def get_food_details(food_id):
         st.error(f"Error fetching food details: {str(e)}")
         return None
     finally:
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
 # Theme CSS
@@ -554,6 +688,10 @@ with st.sidebar:
     # Dark mode toggle
     st.session_state.dark_mode = st.toggle("Dark Mode", value=st.session_state.dark_mode)
     
+    # Navigation mode: tabs run every view on each rerun
+    st.toggle("Load Views on Demand", key="lazy_views",
+              help="Render only the selected view instead of every tab on each rerun")
+    
     # Daily Goals
     st.markdown("### Daily Goals")
     st.session_state.daily_goals['calories'] = st.number_input("Daily Calorie Target", value=2000, min_value=500, max_value=5000)
@@ -600,6 +738,50 @@ with st.sidebar:
     
     st.divider()
     
+    # Query timings and slow query capture (debug only)
+    if os.environ.get('ENABLE_DEBUG_ENDPOINTS', '') in ('1', 'true', 'yes'):
+        with st.expander("Session Queries"):
+            query_stats = st.session_state.get('query_stats', {})
+            if query_stats:
+                st.dataframe(pd.DataFrame([
+                    {
+                        'Query': name,
+                        'Count': entry['count'],
+                        'Errors': entry['errors'],
+                        'Avg (ms)': round(entry['total_ms'] / entry['count'], 1),
+                        'Max (ms)': round(entry['max_ms'], 1),
+                        'Rows': entry['rows']
+                    }
+                    for name, entry in sorted(query_stats.items(), key=lambda item: -item[1]['total_ms'])
+                ]), use_container_width=True, hide_index=True)
+                if st.button("Reset Query Stats", use_container_width=True):
+                    st.session_state.query_stats = {}
+                    st.rerun()
+            else:
+                st.caption("No queries run in this session yet")
+            for name, pool in get_db_router().pools():
+                pool_stats = pool.stats()
+                st.caption(f"Pool {name}: {pool_stats['in_use']} in use, {pool_stats['idle']} idle of "
+                           f"{pool_stats['pool_size']}; {pool_stats['connections_created']} opened, "
+                           f"{pool_stats['validation_failures']} replaced after failed ping")
+        with st.expander("Slow Queries"):
+            slow = get_slow_query_log().snapshot()
+            prepared = get_statement_cache().stats()
+            st.caption(f"Threshold: {slow['threshold_ms']:.0f} ms")
+            st.caption(f"Prepared statements: {prepared['hits']} hits, {prepared['misses']} misses")
+            search_cache = get_search_cache().stats()
+            st.caption(f"Search cache: {search_cache['entries']} entries, {search_cache['hits']} hits, "
+                       f"{search_cache['misses']} misses")
+            best_match_cache = get_best_match_cache().stats()
+            st.caption(f"Best match cache: {best_match_cache['entries']} entries, {best_match_cache['hits']} hits, "
+                       f"{best_match_cache['misses']} misses")
+            for plan in slow['plans']:
+                summary = slow['shapes'].get(plan['shape_id'], {})
+                st.caption(f"{summary.get('count', 0)}x, max {summary.get('max_ms', 0)} ms: "
+                           f"{', '.join(plan['warnings']) or plan['error'] or 'no plan warnings'}")
+                st.code(plan['shape'], language='sql')
+        st.divider()
+    
     # Database info
     stats = get_stats()
     st.markdown("### Database Information")
@@ -630,16 +812,78 @@ with col4:
 
 st.divider()
 
-# Main tabs
-tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["Search", "Browse", "Analysis", "Top Foods", "Comparison", "Meal Planner", "Bookmarks"])
+# View timing
+def view_timing(name):
+    """This session's render timings for a view"""
+    timings = st.session_state.setdefault('view_timings', {})
+    return timings.setdefault(name, {
+        'renders': 0, 'render_ms': 0.0, 'ready_ms': 0.0, 'total_ready_ms': 0.0,
+        'fragment_runs': 0, 'fragment_ms': 0.0, 'total_fragment_ms': 0.0
+    })
 
-# TAB 1: SEARCH
-with tab1:
+def render_view(name, render):
+    """Render one view as part of a full run and record when it became interactive"""
+    started = time.perf_counter()
+    render()
+    finished = time.perf_counter()
+    entry = view_timing(name)
+    entry['renders'] += 1
+    entry['render_ms'] = (finished - started) * 1000
+    # Time from the start of the run until this view was fully drawn
+    entry['ready_ms'] = (finished - run_started) * 1000
+    entry['total_ready_ms'] += entry['ready_ms']
+
+def timed_fragment(name):
+    """st.fragment whose reruns (clicks inside it) are timed on their own"""
+    def decorate(render):
+        @functools.wraps(render)
+        def timed():
+            started = time.perf_counter()
+            render()
+            if not st.session_state.get('full_run'):
+                entry = view_timing(name)
+                entry['fragment_runs'] += 1
+                entry['fragment_ms'] = (time.perf_counter() - started) * 1000
+                entry['total_fragment_ms'] += entry['fragment_ms']
+        return st.fragment(timed)
+    return decorate
+
+@st.fragment
+def search_result_actions(food, idx):
+    """Compare and Bookmark buttons for one result; a click reruns only these"""
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col2:
+        if st.button("Compare", key=f"comp_{idx}"):
+            if food not in st.session_state.comparison_foods:
+                st.session_state.comparison_foods.append(food)
+                st.success(f"Added to comparison")
+            if not st.session_state.lazy_views:
+                # The Comparison tab is drawn on this page too
+                st.rerun()
+    with col3:
+        if st.button("Bookmark", key=f"fav_{idx}"):
+            if food['food_id'] not in [f['food_id'] for f in st.session_state.favorites]:
+                st.session_state.favorites.append({
+                    'food_id': food['food_id'],
+                    'name': food['name']
+                })
+                st.success("Added to bookmarks!")
+
+# VIEW 1: SEARCH
+def render_search_view():
+    """Search box, filters and results"""
     st.subheader("Search and Filter Foods")
     
     col1, col2 = st.columns(2)
     with col1:
-        search_term = st.text_input("Food name", placeholder="e.g., chicken, apple, salmon...")
+        search_term = st.text_input("Food name", placeholder="e.g., chicken, apple, salmon...", key="search_term")
+        if search_term:
+            matches = [food['name'] for food in suggest_foods(search_term, 5)
+                       if food['name'].lower() != search_term.lower()]
+            if matches:
+                st.caption("Suggestions:")
+                for idx, name in enumerate(matches):
+                    st.button(name, key=f"suggest_{idx}", on_click=use_suggestion, args=(name,))
     with col2:
         categories = get_categories()
         cat_options = {cat['name']: cat['category_id'] for cat in categories}
@@ -738,21 +982,7 @@ with tab1:
             
             # Add to comparison
             for idx, food in enumerate(foods[:3]):
-                col1, col2, col3 = st.columns([3, 1, 1])
-                with col2:
-                    if st.button("Compare", key=f"comp_{idx}"):
-                        if food not in st.session_state.comparison_foods:
-                            st.session_state.comparison_foods.append(food)
-                            st.success(f"Added to comparison")
-                        st.rerun()
-                with col3:
-                    if st.button("Bookmark", key=f"fav_{idx}"):
-                        if food['food_id'] not in [f['food_id'] for f in st.session_state.favorites]:
-                            st.session_state.favorites.append({
-                                'food_id': food['food_id'],
-                                'name': food['name']
-                            })
-                            st.success("Added to bookmarks!")
+                search_result_actions(food, idx)
             
             # CSV export
             csv_buffer = StringIO()
@@ -767,14 +997,17 @@ with tab1:
         else:
             st.warning("No foods found")
             if search_term:
-                suggestions = get_similar_foods(search_term, 5)
+                corrected, suggestions = get_similar_foods(search_term, 5)
+                if corrected:
+                    st.info(f"Did you mean: **{corrected}**?")
+                    st.button(f"Search for {corrected}", key="did_you_mean", on_click=use_suggestion, args=(corrected,))
                 if suggestions:
-                    st.info("Did you mean:")
                     for suggestion in suggestions:
                         st.caption(f"- {suggestion}")
 
-# TAB 2: BROWSE
-with tab2:
+# VIEW 2: BROWSE
+def render_browse_view():
+    """Foods of one category"""
     st.subheader("Browse by Category")
     
     categories = get_categories()
@@ -823,8 +1056,11 @@ with tab2:
         else:
             st.info(f"No foods available in {selected_cat_name} at this time.")
 
-# TAB 3: ANALYSIS
-with tab3:
+# VIEW 3: ANALYSIS
+def render_analysis_view():
+    """Catalog-wide nutrition statistics and charts"""
+    import plotly.express as px
+    
     st.subheader("Comprehensive Nutrition Analysis")
     
     extended_stats = get_extended_stats()
@@ -973,8 +1209,9 @@ with tab3:
     else:
         st.info("No analysis data available. Please ensure your database has nutrition records.")
 
-# TAB 4: TOP FOODS
-with tab4:
+# VIEW 4: TOP FOODS
+def render_top_foods_view():
+    """Highest-ranked foods per nutrient"""
     st.subheader("Top Foods Rankings")
     
     col1, col2 = st.columns(2)
@@ -1012,8 +1249,13 @@ with tab4:
     else:
         st.info("No top foods data available for selected criteria")
 
-# TAB 5: FOOD COMPARISON
-with tab5:
+# VIEW 5: FOOD COMPARISON
+@timed_fragment("Comparison")
+def render_comparison_view():
+    """Side-by-side comparison of picked foods"""
+    import plotly.graph_objects as go
+    import plotly.express as px
+    
     st.subheader("Compare Foods Side-by-Side")
     
     st.markdown("### Add Foods to Compare")
@@ -1024,12 +1266,11 @@ with tab5:
     with col2:
         if st.button("Add Food"):
             if search_for_comp:
-                foods = search_foods(search_for_comp, '', '', '', '', '', '', '', '', '')
-                if foods:
-                    if foods[0] not in st.session_state.comparison_foods:
-                        st.session_state.comparison_foods.append(foods[0])
-                        st.success(f"Added {foods[0]['name']} to comparison")
-                    st.rerun()
+                food = find_best_match(search_for_comp)
+                if food:
+                    if food not in st.session_state.comparison_foods:
+                        st.session_state.comparison_foods.append(food)
+                        st.success(f"Added {food['name']} to comparison")
     
     if st.session_state.comparison_foods:
         st.markdown("### Selected Foods")
@@ -1043,7 +1284,31 @@ with tab5:
             with col2:
                 if st.button("Remove", key=f"remove_comp_{idx}"):
                     st.session_state.comparison_foods.pop(idx)
-                    st.rerun()
+                    st.rerun(scope="fragment")
+        
+        if SIMILARITY_ENABLED:
+            with st.expander("Find Foods with a Similar Nutrient Profile"):
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    base_name = st.selectbox("Similar to", [food['name'] for food in comp_foods], key="similar_base")
+                with col2:
+                    same_category = st.checkbox("Same category", key="similar_same_category")
+                base_food = next(food for food in comp_foods if food['name'] == base_name)
+                neighbours = get_nutrient_neighbours(base_food['food_id'], 5, same_category)
+                if not neighbours:
+                    st.caption("No similar foods found")
+                compared_ids = {food['food_id'] for food in comp_foods}
+                for idx, neighbour in enumerate(neighbours):
+                    col1, col2 = st.columns([4, 1])
+                    with col1:
+                        st.caption(f"{neighbour['name']} ({neighbour['category']}) - "
+                                   f"{(neighbour['calories'] or 0):.0f} kcal, "
+                                   f"{(neighbour['protein_g'] or 0):.1f} g protein, "
+                                   f"similarity {neighbour['similarity']:.2f}")
+                    with col2:
+                        if st.button("Add", key=f"add_similar_{idx}", disabled=neighbour['food_id'] in compared_ids):
+                            st.session_state.comparison_foods.append(dict(neighbour, brand=None))
+                            st.rerun(scope="fragment")
         
         if len(comp_foods) >= 2:
             st.divider()
@@ -1116,8 +1381,12 @@ with tab5:
     else:
         st.info("No foods selected yet. Search and add foods from other tabs or search above.")
 
-# TAB 6: MEAL PLANNER
-with tab6:
+# VIEW 6: MEAL PLANNER
+@timed_fragment("Meal Planner")
+def render_meal_planner_view():
+    """Meals of the day against the daily goals"""
+    import plotly.express as px
+    
     st.subheader("Daily Meal Planner with Goals Tracking")
     
     meal_type = st.radio("Select Meal Type:", ["Breakfast", "Lunch", "Dinner", "Snacks"], horizontal=True)
@@ -1129,11 +1398,10 @@ with tab6:
     with col2:
         if st.button(f"Add to {meal_type}"):
             if meal_search:
-                foods = search_foods(meal_search, '', '', '', '', '', '', '', '', '')
-                if foods:
-                    st.session_state.meal_plan[meal_key].append(foods[0])
-                    st.success(f"Added {foods[0]['name']}")
-                    st.rerun()
+                food = find_best_match(meal_search)
+                if food:
+                    st.session_state.meal_plan[meal_key].append(food)
+                    st.success(f"Added {food['name']}")
     
     st.divider()
     
@@ -1159,7 +1427,7 @@ with tab6:
                     with col2:
                         if st.button("x", key=f"remove_meal_{meal}_{idx}"):
                             st.session_state.meal_plan[meal].pop(idx)
-                            st.rerun()
+                            st.rerun(scope="fragment")
                     
                     total_calories += (food['calories'] or 0)
                     total_protein += (food['protein_g'] or 0)
@@ -1257,8 +1525,10 @@ with tab6:
             use_container_width=True
         )
 
-# TAB 7: BOOKMARKS
-with tab7:
+# VIEW 7: BOOKMARKS
+@timed_fragment("Bookmarks")
+def render_bookmarks_view():
+    """Bookmarked foods with their headline nutrients"""
     st.subheader("Your Bookmarked Foods")
     
     if st.session_state.favorites:
@@ -1285,9 +1555,58 @@ with tab7:
                     with col2:
                         if st.button("Remove", key=f"remove_bookmark_{fav['food_id']}"):
                             st.session_state.favorites = [f for f in st.session_state.favorites if f['food_id'] != fav['food_id']]
-                            st.rerun()
+                            st.rerun(scope="fragment")
     else:
         st.info("No bookmarks yet. Search for foods and add them to your bookmarks!")
 
+# Main views
+VIEWS = {
+    "Search": render_search_view,
+    "Browse": render_browse_view,
+    "Analysis": render_analysis_view,
+    "Top Foods": render_top_foods_view,
+    "Comparison": render_comparison_view,
+    "Meal Planner": render_meal_planner_view,
+    "Bookmarks": render_bookmarks_view
+}
+
+# Streamlit forgets the value of a widget that is not rendered in a run;
+# re-assigning these keeps them while their view is hidden
+VIEW_WIDGET_KEYS = ['search_term', 'top_cat', 'comp_search']
+
+if st.session_state.lazy_views:
+    for key in VIEW_WIDGET_KEYS:
+        if key in st.session_state:
+            st.session_state[key] = st.session_state[key]
+    active_view = st.radio("View", list(VIEWS), horizontal=True, key="active_view", label_visibility="collapsed")
+    render_view(active_view, VIEWS[active_view])
+else:
+    for tab, (name, render) in zip(st.tabs(list(VIEWS)), VIEWS.items()):
+        with tab:
+            render_view(name, render)
+
+# View render timings (debug only)
+if os.environ.get('ENABLE_DEBUG_ENDPOINTS', '') in ('1', 'true', 'yes'):
+    with st.sidebar:
+        with st.expander("View Timings"):
+            st.caption("Only the active view renders" if st.session_state.lazy_views else "Every tab renders on each run")
+            timings = st.session_state.get('view_timings', {})
+            if timings:
+                st.dataframe(pd.DataFrame([
+                    {
+                        'View': name,
+                        'Renders': entry['renders'],
+                        'Last render (ms)': round(entry['render_ms'], 1),
+                        'Last ready (ms)': round(entry['ready_ms'], 1),
+                        'Avg ready (ms)': round(entry['total_ready_ms'] / entry['renders'], 1),
+                        'Fragment reruns': entry['fragment_runs'],
+                        'Avg fragment rerun (ms)': round(entry['total_fragment_ms'] / entry['fragment_runs'], 1)
+                                                   if entry['fragment_runs'] else None
+                    }
+                    for name, entry in timings.items()
+                ]), use_container_width=True, hide_index=True)
+
 st.divider()
-st.caption("Nutrition Database Dashboard | Data provided by USDA FoodData Central")
\ No newline at end of file
+st.caption("Nutrition Database Dashboard | Data provided by USDA FoodData Central")
+
+st.session_state.full_run = False